@@ -0,0 +1,160 @@
+# checkpoints.py — контрольные точки запусков для продолжения после остановки или падения
+#
+# Для каждого канала храним:
+#   cursor               — ID сообщения-«водораздела»: все отобранные сообщения новее него
+#                          (включительно) уже сохранены, продолжать можно с offset_id=cursor;
+#   passed_before_cursor — сколько отобранных сообщений лежит до курсора (для точного лимита);
+#   persisted_ids        — сохранённые сообщения старше курсора (обработаны вне очереди,
+#                          т.к. стадии конвейера работают параллельно);
+#   done                 — канал обработан полностью.
+# Документ пишется не на каждое сообщение, а пачками (checkpoints.flush_every / flush_interval),
+# и из конвейера — в потоке, чтобы запись в хранилище не останавливала цикл событий.
+import asyncio
+import time
+from datetime import datetime, timezone
+
+from app.config import get_config
+from app.storage import get_storage
+
+CHECKPOINTS_COLLECTION = "run_checkpoints"
+
+RUNNING = "running"
+FINISHED = "finished"
+CANCELLED = "cancelled"
+FAILED = "failed"
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class ChannelProgress:
+    """Прогресс одного канала внутри запуска."""
+
+    def __init__(self, data: dict | None = None):
+        data = data or {}
+        self.cursor: int = data.get("cursor", 0)
+        self.passed_before_cursor: int = data.get("passed_before_cursor", 0)
+        self.persisted_ids: set[int] = set(data.get("persisted_ids", []))
+        self.done: bool = data.get("done", False)
+        # Отобранные, но ещё не сохранённые сообщения (только в памяти, от новых к старым)
+        self._pending: list[int] = []
+
+    @property
+    def persisted_count(self) -> int:
+        return self.passed_before_cursor + len(self.persisted_ids)
+
+    def mark_passed(self, message_id: int):
+        self._pending.append(message_id)
+
+    def mark_persisted(self, message_id: int):
+        self.persisted_ids.add(message_id)
+        # Сдвигаем курсор по непрерывному префиксу сохранённых сообщений
+        while self._pending and self._pending[0] in self.persisted_ids:
+            head = self._pending.pop(0)
+            self.persisted_ids.discard(head)
+            self.cursor = head
+            self.passed_before_cursor += 1
+
+    def to_dict(self) -> dict:
+        return {
+            "cursor": self.cursor,
+            "passed_before_cursor": self.passed_before_cursor,
+            "persisted_ids": sorted(self.persisted_ids),
+            "done": self.done,
+        }
+
+
+class RunCheckpoint:
+    """Контрольная точка запуска; её ID совпадает с ID первой задачи запуска."""
+
+    def __init__(self, checkpoint_id: str, params: dict, data: dict | None = None):
+        data = data or {}
+        self.id = checkpoint_id
+        self.params = params
+        self.status = data.get("status", RUNNING)
+        self.created_at = data.get("created_at") or _now()
+        self.channels = {ch: ChannelProgress(p) for ch, p in (data.get("channels") or {}).items()}
+        cfg = get_config().get("checkpoints") or {}
+        self.flush_every = max(1, int(cfg.get("flush_every", 10)))
+        self.flush_interval = float(cfg.get("flush_interval", 5))
+        self._unflushed = 0
+        self._flushed_at = time.monotonic()
+        self._flush_lock = asyncio.Lock()
+
+    @classmethod
+    def create(cls, checkpoint_id: str, params: dict) -> "RunCheckpoint":
+        checkpoint = cls(checkpoint_id, params)
+        checkpoint.flush()
+        return checkpoint
+
+    @classmethod
+    def load(cls, checkpoint_id: str) -> "RunCheckpoint | None":
+        data = get_storage().get_document(CHECKPOINTS_COLLECTION, checkpoint_id)
+        if not data:
+            return None
+        return cls(checkpoint_id, data.get("params") or {}, data)
+
+    @classmethod
+    def latest_resumable(cls) -> "RunCheckpoint | None":
+        """Последний незавершённый запуск (остановленный, упавший или прерванный перезапуском)."""
+        docs = get_storage().list_documents(CHECKPOINTS_COLLECTION, order_by="created_at", descending=True, limit=1)
+        if not docs or docs[0].get("status") == FINISHED:
+            return None
+        data = docs[0]
+        return cls(data["id"], data.get("params") or {}, data)
+
+    def channel(self, ch: str) -> ChannelProgress:
+        if ch not in self.channels:
+            self.channels[ch] = ChannelProgress()
+        return self.channels[ch]
+
+    @property
+    def persisted_count(self) -> int:
+        return sum(p.persisted_count for p in self.channels.values())
+
+    async def mark_persisted(self, ch: str, message_id: int):
+        self.channel(ch).mark_persisted(message_id)
+        self._unflushed += 1
+        due = self._unflushed >= self.flush_every or time.monotonic() - self._flushed_at >= self.flush_interval
+        # Пока идёт запись, стадии не ждут её: накопленное уйдёт следующей пачкой
+        if due and not self._flush_lock.locked():
+            await self.flush_async()
+
+    async def finish_channel(self, ch: str):
+        self.channel(ch).done = True
+        await self.flush_async()
+
+    def set_status(self, status: str):
+        self.status = status
+        self.flush()
+
+    def _snapshot(self) -> dict:
+        return {
+            "params": self.params,
+            "status": self.status,
+            "created_at": self.created_at,
+            "updated_at": _now(),
+            "channels": {ch: p.to_dict() for ch, p in self.channels.items()},
+        }
+
+    def _write(self, data: dict):
+        try:
+            get_storage().set_document(CHECKPOINTS_COLLECTION, self.id, data)
+        except Exception as e:
+            print(f"Could not save checkpoint {self.id}: {e}")
+
+    def flush(self):
+        """Записывает контрольную точку в хранилище (блокирующий вызов)."""
+        self._unflushed = 0
+        self._flushed_at = time.monotonic()
+        self._write(self._snapshot())
+
+    async def flush_async(self):
+        """Как flush(), но запись идёт в потоке; снимок берётся в цикле событий,
+        пока стадии конвейера не меняют прогресс. Записи идут по очереди, поэтому
+        более старый снимок не перезапишет более новый."""
+        async with self._flush_lock:
+            self._unflushed = 0
+            self._flushed_at = time.monotonic()
+            await asyncio.to_thread(self._write, self._snapshot())
@@ -0,0 +1,23 @@
+# config.py — ленивое чтение config.yaml и .env
+# Модуль намеренно лёгкий: никаких тяжёлых импортов, чтобы `import app.web` оставался быстрым.
+import os
+from functools import lru_cache
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONFIG_PATH = os.path.join(BASE_DIR, "config.yaml")
+
+
+@lru_cache(maxsize=1)
+def load_env():
+    """Загружает переменные из .env один раз за процесс."""
+    from dotenv import load_dotenv
+    load_dotenv()
+    return True
+
+
+@lru_cache(maxsize=1)
+def get_config() -> dict:
+    """Читает config.yaml при первом обращении и кэширует результат."""
+    import yaml
+    with open(CONFIG_PATH, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f) or {}
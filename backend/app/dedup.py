@@ -0,0 +1,284 @@
+# dedup.py — поиск почти-дубликатов постов до скачивания медиа
+# Каналы-источники часто репостят друг друга, и один и тот же текст с картинкой
+# скачивался, брендировался, сохранялся и переводился по нескольку раз.
+# Для каждого сохранённого поста храним отпечатки:
+#   text_hash  — SimHash (64 бита) нормализованного текста;
+#   image_hash — dHash (64 бита) миниатюры из Telegram (крошечная, обычно уже
+#                лежит в самом сообщении, поэтому медиа целиком не качаем).
+# Похожие отпечатки отличаются в нескольких битах (расстояние Хэмминга). Чтобы не
+# сравнивать с каждым постом, хэш режется на 8 полос по 8 бит: при расстоянии
+# не больше 7 хотя бы одна полоса совпадает точно, её и ищем по индексу.
+# Индекс локальный (SQLite, dedup.path), общий для сервера и воркеров.
+import hashlib
+import io
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from app.config import BASE_DIR, get_config
+from app.firebase_manager import get_post
+from app.messages import DOCUMENT, PHOTO, classify_message
+
+TEXT = "text"
+IMAGE = "image"
+
+BANDS = 8
+BAND_BITS = 64 // BANDS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fingerprints (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    post_id TEXT NOT NULL,
+    source_channel TEXT,
+    message_id INTEGER,
+    text_hash INTEGER,
+    image_hash INTEGER,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS fingerprint_bands (
+    kind TEXT NOT NULL,
+    key INTEGER NOT NULL,
+    fingerprint_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_fingerprint_bands_key ON fingerprint_bands (kind, key);
+CREATE INDEX IF NOT EXISTS idx_fingerprint_bands_fp ON fingerprint_bands (fingerprint_id);
+CREATE TABLE IF NOT EXISTS dedup_counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+_URL_RE = re.compile(r"https?://\S+|www\.\S+|t\.me/\S+")
+_MENTION_RE = re.compile(r"[@#]\w+")
+_NON_WORD_RE = re.compile(r"[^\w\s]+")
+
+
+# --- Отпечатки ---
+
+def normalize_text(text: str) -> str:
+    """Нижний регистр, без ссылок, упоминаний, хэштегов и пунктуации — подписи репостов отличаются именно ими."""
+    text = (text or "").lower()
+    text = _URL_RE.sub(" ", text)
+    text = _MENTION_RE.sub(" ", text)
+    text = _NON_WORD_RE.sub(" ", text)
+    return " ".join(text.split())
+
+
+def simhash(text: str) -> int:
+    """64-битный SimHash по словесным триграммам нормализованного текста."""
+    words = text.split()
+    shingles = [" ".join(words[i:i + 3]) for i in range(max(1, len(words) - 2))]
+    weights = [0] * 64
+    for shingle in shingles:
+        h = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+
+def dhash(image_bytes: bytes) -> int | None:
+    """64-битный разностный хэш картинки (9x8 в оттенках серого, сравнение соседних пикселей)."""
+    from PIL import Image
+    try:
+        img = Image.open(io.BytesIO(image_bytes)).convert("L").resize((9, 8), Image.LANCZOS)
+    except Exception as e:
+        print("Image hash error:", e)
+        return None
+    px = list(img.getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = value << 1 | (px[row * 9 + col] < px[row * 9 + col + 1])
+    # Почти однотонные картинки дают вырожденный хэш и совпадали бы друг с другом
+    if not 8 <= value.bit_count() <= 56:
+        return None
+    return value
+
+
+class Fingerprint:
+    """Отпечатки одного сообщения; любой из хэшей может отсутствовать."""
+
+    def __init__(self, text_hash: int | None = None, image_hash: int | None = None):
+        self.text_hash = text_hash
+        self.image_hash = image_hash
+
+    def __bool__(self):
+        return self.text_hash is not None or self.image_hash is not None
+
+
+async def fingerprint_message(client, m, min_text_length: int = 40) -> Fingerprint:
+    """Считает отпечатки сообщения; для картинки качает только миниатюру."""
+    normalized = normalize_text(getattr(m, "message", "") or "")
+    text_hash = simhash(normalized) if len(normalized) >= min_text_length else None
+
+    image_hash = None
+    try:
+        kind = classify_message(m)
+    except Exception:
+        kind = None
+    if kind in (PHOTO, DOCUMENT):
+        try:
+            thumb = await client.download_media(m, file=bytes, thumb=0)
+        except Exception as e:
+            print(f"Thumbnail download error for message {m.id}:", e)
+            thumb = None
+        if thumb:
+            image_hash = dhash(thumb)
+    return Fingerprint(text_hash, image_hash)
+
+
+# --- Индекс ---
+
+def _signed(value: int) -> int:
+    # SQLite хранит INTEGER как знаковое 64-битное
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+def _band_keys(value: int) -> list[int]:
+    mask = (1 << BAND_BITS) - 1
+    return [band << BAND_BITS | (value >> band * BAND_BITS & mask) for band in range(BANDS)]
+
+
+class DedupIndex:
+    """Локальный индекс отпечатков сохранённых постов."""
+
+    def __init__(self, path: str, text_distance: int = 3, image_distance: int = 4):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.text_distance = text_distance
+        self.image_distance = image_distance
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._lock = threading.RLock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+
+    def _candidates(self, kind: str, value: int) -> list:
+        column = "text_hash" if kind == TEXT else "image_hash"
+        keys = _band_keys(value)
+        placeholders = ", ".join("?" * len(keys))
+        with self._lock:
+            return self._conn.execute(
+                f"SELECT DISTINCT f.id, f.post_id, f.source_channel, f.message_id, f.{column} "
+                f"FROM fingerprint_bands b JOIN fingerprints f ON f.id = b.fingerprint_id "
+                f"WHERE b.kind = ? AND b.key IN ({placeholders})",
+                (kind, *keys),
+            ).fetchall()
+
+    def _closest(self, kind: str, value: int, threshold: int, source: tuple) -> dict | None:
+        best = None
+        for fp_id, post_id, source_channel, message_id, stored in self._candidates(kind, value):
+            # Само сообщение (повторный запуск) дубликатом себя не считается
+            if (source_channel, message_id) == source:
+                continue
+            distance = (_unsigned(stored) ^ value).bit_count()
+            if distance <= threshold and (best is None or distance < best["distance"]):
+                best = {"fingerprint_id": fp_id, "post_id": post_id, "source_channel": source_channel,
+                        "message_id": message_id, "kind": kind, "distance": distance}
+        return best
+
+    def find(self, fingerprint: Fingerprint, source_channel: str | None = None, message_id: int | None = None) -> dict | None:
+        """Ближайший сохранённый почти-дубликат сообщения или None.
+
+        Пост, удалённый из хранилища, из индекса вычищается и дубликатом не считается;
+        пост из того же сообщения (source_channel, message_id) тоже не считается.
+        """
+        for kind, value, threshold in (
+            (TEXT, fingerprint.text_hash, self.text_distance),
+            (IMAGE, fingerprint.image_hash, self.image_distance),
+        ):
+            if value is None:
+                continue
+            while True:
+                match = self._closest(kind, value, threshold, (source_channel, message_id))
+                if match is None:
+                    break
+                if get_post(match["post_id"]) is not None:
+                    self.count(f"{kind}_matches")
+                    return match
+                self.remove(match["fingerprint_id"])
+        return None
+
+    def add(self, post_id: str, source_channel: str, message_id: int, fingerprint: Fingerprint):
+        if not fingerprint:
+            return
+        text_hash, image_hash = fingerprint.text_hash, fingerprint.image_hash
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                fp_id = self._conn.execute(
+                    "INSERT INTO fingerprints (post_id, source_channel, message_id, text_hash, image_hash, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (post_id, source_channel, message_id,
+                     _signed(text_hash) if text_hash is not None else None,
+                     _signed(image_hash) if image_hash is not None else None,
+                     time.time()),
+                ).lastrowid
+                bands = []
+                for kind, value in ((TEXT, text_hash), (IMAGE, image_hash)):
+                    if value is not None:
+                        bands += [(kind, key, fp_id) for key in _band_keys(value)]
+                self._conn.executemany("INSERT INTO fingerprint_bands (kind, key, fingerprint_id) VALUES (?, ?, ?)", bands)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def remove(self, fingerprint_id: int):
+        with self._lock:
+            self._conn.execute("DELETE FROM fingerprint_bands WHERE fingerprint_id = ?", (fingerprint_id,))
+            self._conn.execute("DELETE FROM fingerprints WHERE id = ?", (fingerprint_id,))
+
+    def clear(self):
+        """Очищает отпечатки (после удаления всех постов); счётчики сохраняются."""
+        with self._lock:
+            self._conn.execute("DELETE FROM fingerprint_bands")
+            self._conn.execute("DELETE FROM fingerprints")
+
+    def count(self, name: str, amount: int = 1):
+        # Счётчики в той же базе, чтобы суммировались по серверу и всем воркерам
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO dedup_counters (name, value) VALUES (?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET value = value + excluded.value",
+                (name, amount),
+            )
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._conn.execute("SELECT name, value FROM dedup_counters").fetchall())
+            total = self._conn.execute("SELECT COUNT(*) FROM fingerprints").fetchone()[0]
+        return {"fingerprints": total, "counters": counters}
+
+
+_index: DedupIndex | None = None
+
+
+def get_dedup_config() -> dict:
+    return get_config().get("dedup") or {}
+
+
+def get_dedup_index() -> DedupIndex | None:
+    """Индекс из config.yaml (dedup.*) или None, если поиск дубликатов выключен."""
+    global _index
+    cfg = get_dedup_config()
+    if not cfg.get("enabled", False):
+        return None
+    if _index is None:
+        path = os.getenv("DEDUP_PATH") or cfg.get("path") or "data/dedup.db"
+        if path != ":memory:" and not os.path.isabs(path):
+            path = os.path.join(BASE_DIR, path)
+        _index = DedupIndex(
+            path,
+            text_distance=int(cfg.get("text_distance", 3)),
+            image_distance=int(cfg.get("image_distance", 4)),
+        )
+    return _index
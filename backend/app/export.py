@@ -0,0 +1,107 @@
+# export.py — потоковая выгрузка сохранённых постов (NDJSON / CSV)
+# Посты читаются страницами по курсору (original_date, id) и сразу уходят
+# клиенту, поэтому память не зависит от размера коллекции. У каждой записи есть
+# поле cursor: если соединение оборвалось, выгрузку продолжают с курсора
+# последней полученной записи (?cursor=...) с теми же фильтрами.
+import asyncio
+import base64
+import csv
+import io
+import json
+from datetime import datetime, timezone
+
+from fastapi.encoders import jsonable_encoder
+
+from app.config import get_config
+from app.firebase_manager import get_posts_page
+
+NDJSON = "ndjson"
+CSV = "csv"
+EXPORT_FORMATS = (NDJSON, CSV)
+
+MEDIA_TYPES = {
+    NDJSON: "application/x-ndjson",
+    CSV: "text/csv; charset=utf-8",
+}
+
+CSV_COLUMNS = [
+    "id", "source_channel", "original_message_id", "original_date", "content",
+    "translated_content", "target_lang", "has_media", "media_count", "is_merged",
+    "is_top_post", "original_views", "original_likes", "original_comments",
+    "duplicate_of", "saved_at", "cursor",
+]
+
+
+def get_export_config() -> dict:
+    return get_config().get("export") or {}
+
+
+def _utc(dt: datetime) -> datetime:
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt
+
+
+def encode_cursor(post: dict) -> str:
+    """Непрозрачный курсор записи: дата и ID в base64url."""
+    raw = json.dumps({"d": _utc(post["original_date"]).isoformat(), "id": post["id"]}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """Обратное к encode_cursor; ValueError, если курсор испорчен."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(data["d"]), str(data["id"])
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def _csv_value(value):
+    if isinstance(value, datetime):
+        return _utc(value).isoformat()
+    if value is None:
+        return ""
+    return value
+
+
+async def iter_export(fmt: str = NDJSON, source_channel: str | None = None, date_from: datetime | None = None,
+                      date_to: datetime | None = None, after: tuple | None = None, limit: int | None = None,
+                      page_size: int | None = None):
+    """Асинхронно отдаёт выгрузку кусками (по странице постов за раз)."""
+    page_size = max(1, int(page_size or get_export_config().get("page_size", 500)))
+    date_from = _utc(date_from) if date_from else None
+    date_to = _utc(date_to) if date_to else None
+    left = limit
+
+    if fmt == CSV:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(CSV_COLUMNS)
+        yield buffer.getvalue()
+
+    while left is None or left > 0:
+        size = page_size if left is None else min(page_size, left)
+        # Запрос к хранилищу блокирующий — уводим в поток, чтобы не держать цикл событий
+        page = await asyncio.to_thread(get_posts_page, size, after=after, source_channel=source_channel,
+                                       date_from=date_from, date_to=date_to)
+        if not page:
+            return
+
+        buffer = io.StringIO()
+        if fmt == CSV:
+            writer = csv.writer(buffer)
+        for post in page:
+            post["cursor"] = encode_cursor(post)
+            if fmt == CSV:
+                writer.writerow([_csv_value(post.get(column)) for column in CSV_COLUMNS])
+            else:
+                buffer.write(json.dumps(jsonable_encoder(post), ensure_ascii=False))
+                buffer.write("\n")
+        yield buffer.getvalue()
+
+        last = page[-1]
+        after = (last["original_date"], last["id"])
+        if left is not None:
+            left -= len(page)
+        if len(page) < size:
+            return
@@ -1,103 +1,201 @@
-import firebase_admin
-from firebase_admin import credentials, firestore
-
-def initialize_firestore():
-    """Initializes the Firestore client, safely checking if it's already initialized."""
-    if not firebase_admin._apps:
-        import os
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        cred_path = os.path.join(base_dir, "firebase-credentials.json")
-        cred = credentials.Certificate(cred_path)
-        firebase_admin.initialize_app(cred)
-    
-    return firestore.client()
-
-db = initialize_firestore()
+# Persistence facade. The functions below keep their historical names, but the
+# actual engine (Firestore or local SQLite) is chosen in config.yaml -> storage.backend.
+import copy
+
+from app.config import get_config
+from app.storage import POSTS_COLLECTION, get_storage
+from app.storage.base import CLEAR, DELETE, INSERT, UPDATE, apply_updates, deep_merge
+from app.storage.cache import CachedDocument
+
 STATE_COLLECTION = "pipeline_state"
-POSTS_COLLECTION = "parsed_posts"
 CHANNELS_COLLECTION = "saved_channel"
 MAIN_DOC = "progress_tracker"
+MIGRATIONS_DOC = "migrations"
+
+def _load_state(storage):
+    return storage.get_document(STATE_COLLECTION, MAIN_DOC) or {}
+
+def _watch_state(storage, callback):
+    return storage.watch_document(STATE_COLLECTION, MAIN_DOC, lambda data: callback(data or {}))
+
+_state_cache = CachedDocument("pipeline state", _load_state, _watch_state)
+
+def _write_through(cache: CachedDocument, write, change=None):
+    """Runs a write; then updates the cached copy with `change` or, without one, drops it."""
+    try:
+        write()
+    except Exception:
+        cache.invalidate()
+        raise
+    if change is None:
+        cache.invalidate()
+    else:
+        cache.modify(change)
 
 def get_state_document():
-    """Fetches the main state document from Firestore."""
-    doc_ref = db.collection(STATE_COLLECTION).document(MAIN_DOC)
-    doc = doc_ref.get()
-    if doc.exists:
-        return doc.to_dict()
-    return {}
+    """Fetches the main state document (served from the in-process cache when fresh)."""
+    return _state_cache.get()
 
 def update_state(updates: dict):
     """Updates fields in the main state document."""
-    doc_ref = db.collection(STATE_COLLECTION).document(MAIN_DOC)
-    doc_ref.update(updates)
+    _write_through(_state_cache,
+                   lambda: get_storage().update_document(STATE_COLLECTION, MAIN_DOC, updates),
+                   lambda state: apply_updates(state, copy.deepcopy(updates)))
+
+def increment_state(field: str, amount: int = 1):
+    """Atomically increments a numeric field of the main state document."""
+    # Other processes increment the same field, so the exact value is only known to the store
+    _write_through(_state_cache, lambda: get_storage().increment_field(STATE_COLLECTION, MAIN_DOC, field, amount))
+
+def set_state(state: dict, merge: bool = False):
+    """Sets the entire state document (overwrites unless merge is True)."""
+    write = lambda: get_storage().set_document(STATE_COLLECTION, MAIN_DOC, state, merge=merge)
+    if merge:
+        _write_through(_state_cache, write, lambda current: deep_merge(current, state))
+    else:
+        _write_through(_state_cache, write)
+        _state_cache.put(state)
+
+def get_migrations_document():
+    """Fetches the document that records applied one-time migrations."""
+    return get_storage().get_document(STATE_COLLECTION, MIGRATIONS_DOC) or {}
+
+def mark_migration_done(name: str):
+    """Records a one-time migration as applied."""
+    storage = get_storage()
+    storage.set_document(STATE_COLLECTION, MIGRATIONS_DOC, {name: storage.server_timestamp()}, merge=True)
+
+# --- Post change log (incremental sync of /posts) ---
 
-def set_state(state: dict):
-    """Sets the entire state document (overwrites)."""
-    doc_ref = db.collection(STATE_COLLECTION).document(MAIN_DOC)
-    doc_ref.set(state)
+def _get_sync_config() -> dict:
+    return get_config().get("posts_sync") or {}
+
+def _record_post_change(post_id: str | None, op: str):
+    """Bumps the posts version after a write; a failure here must not fail the write itself."""
+    try:
+        storage = get_storage()
+        version = storage.record_post_change(post_id, op)
+        keep = int(_get_sync_config().get("changes_retention", 5000))
+        # Prune rarely: clients behind the retained window simply reload the full list
+        if version % 500 == 0:
+            storage.prune_post_changes(keep)
+    except Exception as e:
+        print(f"Error recording change of post {post_id}: {e}")
+
+def get_posts_version() -> int:
+    """Returns the current version of the posts collection."""
+    return get_storage().posts_version()
+
+def get_post_changes(since: int) -> dict:
+    """Collapses the change log after `since` into inserted/updated/deleted post IDs.
+
+    `reset` is True when the client has to reload the full list instead: the log
+    was pruned past `since`, all posts were deleted, or there are too many changes.
+    """
+    storage = get_storage()
+    version = storage.posts_version()
+    result = {"version": version, "reset": False, "inserted": [], "updated": [], "deleted": []}
+    if since == version:
+        return result
+    limit = int(_get_sync_config().get("max_changes", 1000))
+    if since > version or since < storage.post_changes_floor():
+        result["reset"] = True
+        return result
+    changes = storage.list_post_changes(since, limit + 1)
+    if len(changes) > limit or any(c["op"] == CLEAR for c in changes):
+        result["reset"] = True
+        return result
+
+    inserted, updated, deleted = {}, {}, {}
+    for change in changes:
+        post_id, op = change["post_id"], change["op"]
+        if op == INSERT:
+            inserted[post_id] = True
+        elif op == UPDATE:
+            if post_id not in inserted:
+                updated[post_id] = True
+        elif op == DELETE:
+            # Created and deleted within the window: the client never saw it
+            if inserted.pop(post_id, None) is None:
+                deleted[post_id] = True
+            updated.pop(post_id, None)
+    if changes:
+        result["version"] = changes[-1]["version"]
+    result.update(inserted=list(inserted), updated=list(updated), deleted=list(deleted))
+    return result
 
 def save_post(post_data: dict):
-    """Saves a post document to the parsed_posts collection with a server timestamp."""
+    """Saves a post document to the parsed_posts collection with a server timestamp.
+
+    Returns the generated document ID, or None on error.
+    """
     if not isinstance(post_data, dict):
         print("Error: post_data must be a dictionary.")
-        return
-    
+        return None
+
     try:
+        storage = get_storage()
         # Добавляем серверную временную метку
-        post_data['saved_at'] = firestore.SERVER_TIMESTAMP
-        
-        # Используем add() для создания документа с авто-ID
-        db.collection(POSTS_COLLECTION).add(post_data)
-        
+        post_data['saved_at'] = storage.server_timestamp()
+
+        # Документ создаётся с авто-ID
+        post_id = storage.add_post(post_data)
+        _record_post_change(post_id, INSERT)
+
         # Логируем для отладки
         original_id = post_data.get('original_message_id', 'N/A')
-        print(f"Successfully saved post (original_id: {original_id}) to Firestore collection '{POSTS_COLLECTION}'.")
+        print(f"Successfully saved post (original_id: {original_id}) to {storage.name} collection '{POSTS_COLLECTION}'.")
+        return post_id
 
     except Exception as e:
-        print(f"Error saving post to Firestore: {e}")
+        print(f"Error saving post: {e}")
+        return None
 
 def get_all_posts():
     """Fetches all posts from the parsed_posts collection, ordered by date."""
     try:
-        posts_ref = db.collection(POSTS_COLLECTION).order_by("original_date", direction=firestore.Query.DESCENDING)
-        docs = posts_ref.stream()
-        
-        posts = []
-        for doc in docs:
-            post_data = doc.to_dict()
-            post_data['id'] = doc.id # Добавляем ID документа
-            posts.append(post_data)
-        
-        return posts
+        return get_storage().list_posts()
     except Exception as e:
         print(f"Error fetching posts: {e}")
         return []
 
+def get_posts_page(limit: int, after: tuple | None = None, source_channel: str | None = None, date_from=None, date_to=None):
+    """Fetches one page of posts ordered by (original_date, id) for streaming export.
+
+    Unlike the other readers, errors are raised: a silently empty page would end an export early.
+    """
+    return get_storage().list_posts_page(limit, after=after, source_channel=source_channel,
+                                         date_from=date_from, date_to=date_to)
+
 def get_post(post_id: str):
     """Fetches a single post by its document ID."""
     try:
-        doc_ref = db.collection(POSTS_COLLECTION).document(post_id)
-        doc = doc_ref.get()
-        if doc.exists:
-            return doc.to_dict()
-        return None
+        return get_storage().get_post(post_id)
     except Exception as e:
         print(f"Error fetching post {post_id}: {e}")
         return None
 
+def find_post_by_message(source_channel: str, message_id: int):
+    """Finds the post saved for a Telegram message (returns it with its 'id'), or None."""
+    try:
+        return get_storage().find_post_by_message(source_channel, message_id)
+    except Exception as e:
+        print(f"Error looking up post for message {message_id} of {source_channel}: {e}")
+        return None
+
 def update_post(post_id: str, updates: dict):
     """Updates fields in a specific post document."""
     try:
-        doc_ref = db.collection(POSTS_COLLECTION).document(post_id)
-        doc_ref.update(updates)
+        get_storage().update_post(post_id, updates)
+        _record_post_change(post_id, UPDATE)
     except Exception as e:
         print(f"Error updating post {post_id}: {e}")
 
 def delete_post(post_id: str):
     """Deletes a single post by its document ID."""
     try:
-        doc_ref = db.collection(POSTS_COLLECTION).document(post_id)
-        doc_ref.delete()
+        get_storage().delete_post(post_id)
+        _record_post_change(post_id, DELETE)
         print(f"Successfully deleted post {post_id}")
         return True
     except Exception as e:
@@ -107,20 +205,28 @@ def delete_post(post_id: str):
 def delete_all_posts():
     """Deletes all posts from the parsed_posts collection."""
     try:
-        posts_ref = db.collection(POSTS_COLLECTION)
-        docs = posts_ref.stream()
-        
-        deleted_count = 0
-        for doc in docs:
-            doc.reference.delete()
-            deleted_count += 1
-        
+        deleted_count = get_storage().delete_all_posts()
+        _record_post_change(None, CLEAR)
         print(f"Successfully deleted {deleted_count} posts")
         return deleted_count
     except Exception as e:
         print(f"Error deleting all posts: {e}")
         return 0
 
+def _load_saved_channel(storage):
+    channels = storage.list_documents(CHANNELS_COLLECTION, order_by="saved_at", descending=True, limit=1)
+    return channels[0] if channels else None
+
+def _watch_saved_channel(storage, callback):
+    return storage.watch_documents(CHANNELS_COLLECTION, lambda channels: callback(channels[0] if channels else None),
+                                   order_by="saved_at", descending=True, limit=1)
+
+_channel_cache = CachedDocument("saved channel", _load_saved_channel, _watch_saved_channel)
+
+def get_cache_stats() -> dict:
+    """Hit/miss counters of the in-process document caches."""
+    return {"state": _state_cache.stats(), "saved_channel": _channel_cache.stats()}
+
 def save_channel(channel_username: str):
     """Saves a channel username to the saved_channels collection. Only keeps one channel - the latest."""
     try:
@@ -129,18 +235,22 @@ def save_channel(channel_username: str):
         if not clean_username:
             print("Channel username is empty")
             return False
-        
-        # Delete all existing channels first (we only keep one)
-        existing_channels = list(db.collection(CHANNELS_COLLECTION).get())
-        for doc in existing_channels:
-            doc.reference.delete()
-        
-        # Save new channel
-        channel_data = {
-            'username': clean_username,
-            'saved_at': firestore.SERVER_TIMESTAMP
-        }
-        db.collection(CHANNELS_COLLECTION).add(channel_data)
+
+        storage = get_storage()
+
+        def write():
+            # Delete all existing channels first (we only keep one)
+            storage.delete_collection(CHANNELS_COLLECTION)
+
+            # Save new channel
+            channel_data = {
+                'username': clean_username,
+                'saved_at': storage.server_timestamp()
+            }
+            storage.add_document(CHANNELS_COLLECTION, channel_data)
+
+        # saved_at is set by the server, so the next read fetches the stored document
+        _write_through(_channel_cache, write)
         print(f"Successfully saved channel @{clean_username} (replaced all previous)")
         return True
     except Exception as e:
@@ -150,13 +260,7 @@ def save_channel(channel_username: str):
 def get_saved_channel():
     """Fetches the saved channel (only one exists)."""
     try:
-        channels_ref = db.collection(CHANNELS_COLLECTION).order_by("saved_at", direction=firestore.Query.DESCENDING).limit(1)
-        channels = list(channels_ref.get())
-        if channels:
-            channel_data = channels[0].to_dict()
-            channel_data['id'] = channels[0].id
-            return channel_data
-        return None
+        return _channel_cache.get()
     except Exception as e:
         print(f"Error fetching channel: {e}")
         return None
@@ -167,7 +271,7 @@ def is_channel_saved(channel_username: str):
         clean_username = channel_username.lstrip('@').strip()
         if not clean_username:
             return False
-        
+
         saved_channel = get_saved_channel()
         if saved_channel and saved_channel.get('username') == clean_username:
             return True
@@ -179,13 +283,9 @@ def is_channel_saved(channel_username: str):
 def delete_saved_channel():
     """Deletes the saved channel."""
     try:
-        existing = list(db.collection(CHANNELS_COLLECTION).get())
-        
-        deleted_count = 0
-        for doc in existing:
-            doc.reference.delete()
-            deleted_count += 1
-        
+        deleted_count = get_storage().delete_collection(CHANNELS_COLLECTION)
+        _channel_cache.put(None)
+
         if deleted_count > 0:
             print(f"Successfully deleted saved channel")
             return True
@@ -193,6 +293,7 @@ def delete_saved_channel():
             print(f"No saved channel found")
             return False
     except Exception as e:
+        _channel_cache.invalidate()
         print(f"Error deleting saved channel: {e}")
         return False
 
@@ -200,18 +301,13 @@ def cleanup_old_channels_collection():
     """Deletes the old 'saved_channels' collection if it exists."""
     try:
         old_collection = "saved_channels"
-        existing = list(db.collection(old_collection).get())
-        
-        deleted_count = 0
-        for doc in existing:
-            doc.reference.delete()
-            deleted_count += 1
-        
+        deleted_count = get_storage().delete_collection(old_collection)
+
         if deleted_count > 0:
             print(f"Successfully cleaned up old collection '{old_collection}' - deleted {deleted_count} documents")
         else:
             print(f"Old collection '{old_collection}' was already empty or doesn't exist")
-        
+
         return True
     except Exception as e:
         print(f"Error cleaning up old channels collection: {e}")
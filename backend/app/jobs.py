@@ -0,0 +1,192 @@
+# jobs.py — планировщик запусков пайплайна
+# Вместо одной глобальной задачи: у каждого запуска свой ID, очередь, прогресс и отмена.
+# Одновременно выполняется не больше `jobs.max_concurrent` задач, остальные ждут в очереди.
+import asyncio
+import uuid
+from datetime import datetime, timezone
+from typing import Awaitable, Callable
+
+from app.firebase_manager import set_state
+from app.state_manager import current_job
+
+QUEUED = "queued"
+RUNNING = "running"
+FINISHED = "finished"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class Job:
+    """Один запуск пайплайна: параметры, статус и прогресс."""
+
+    def __init__(self, params: dict):
+        self.id = uuid.uuid4().hex[:12]
+        self.params = params
+        self.status = QUEUED
+        self.processed = 0
+        self.total = 0
+        self.error: str | None = None
+        self.created_at = _now()
+        self.started_at: datetime | None = None
+        self.finished_at: datetime | None = None
+        self.cancel_requested = False
+        self.task: asyncio.Task | None = None
+
+    @property
+    def is_active(self) -> bool:
+        return self.status in ACTIVE_STATUSES
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "params": self.params,
+            "status": self.status,
+            "processed": self.processed,
+            "total": self.total,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+    def to_state(self) -> dict:
+        """Прогресс в формате старого /status (processed/total/is_running/finished)."""
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "processed": self.processed,
+            "total": self.total,
+            "is_running": self.is_active,
+            "finished": not self.is_active,
+        }
+
+
+class JobScheduler:
+    """Очередь задач с ограничением параллелизма."""
+
+    def __init__(self, runner: Callable[..., Awaitable], max_concurrent: int = 1, history: int = 50):
+        self.runner = runner
+        self.jobs: dict[str, Job] = {}
+        self._queue: asyncio.Queue | None = None
+        self._workers: list[asyncio.Task] = []
+        self._stopping = False
+        self.configure(max_concurrent, history)
+
+    def configure(self, max_concurrent: int = 1, history: int = 50):
+        """Задаёт лимиты; параллелизм применяется при следующем start()."""
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.history = max(1, int(history))
+
+    def start(self):
+        """Запускает воркеры планировщика (вызывается в lifespan приложения)."""
+        if self._workers:
+            return
+        self._queue = asyncio.Queue()
+        self._stopping = False
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.max_concurrent)]
+
+    async def stop(self):
+        """Отменяет все активные задачи и останавливает воркеры."""
+        # До cancel(): по флагу _run отличает остановку сервера от отмены одной задачи
+        self._stopping = True
+        for job in list(self.jobs.values()):
+            self.cancel(job.id)
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, params: dict) -> Job:
+        """Ставит новый запуск в очередь и возвращает его."""
+        if not self._workers:
+            self.start()
+        job = Job(params)
+        self.jobs[job.id] = job
+        self._trim_history()
+        self._queue.put_nowait(job)
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        return self.jobs.get(job_id)
+
+    def list(self) -> list[Job]:
+        """Задачи от новых к старым."""
+        return sorted(self.jobs.values(), key=lambda j: j.created_at, reverse=True)
+
+    def latest(self) -> Job | None:
+        jobs = self.list()
+        return jobs[0] if jobs else None
+
+    def cancel(self, job_id: str) -> bool:
+        """Отменяет задачу в очереди или в работе. False — задача не найдена или уже завершена."""
+        job = self.jobs.get(job_id)
+        if not job or not job.is_active:
+            return False
+        job.cancel_requested = True
+        if job.status == QUEUED:
+            job.status = CANCELLED
+            job.finished_at = _now()
+        elif job.task and not job.task.done():
+            job.task.cancel()
+        return True
+
+    def _trim_history(self):
+        finished = [j for j in self.list() if not j.is_active]
+        for job in finished[self.history:]:
+            self.jobs.pop(job.id, None)
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                if job.status == QUEUED:
+                    await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job):
+        job.status = RUNNING
+        job.started_at = _now()
+        await self._persist(job)
+        # Прогресс из state_manager пойдёт в эту задачу (контекст копируется в дочернюю задачу)
+        token = current_job.set(job)
+        try:
+            job.task = asyncio.create_task(self.runner(**job.params))
+        finally:
+            current_job.reset(token)
+
+        try:
+            await job.task
+            job.status = CANCELLED if job.cancel_requested else FINISHED
+        except asyncio.CancelledError:
+            job.status = CANCELLED
+            if not job.cancel_requested or self._stopping:
+                # Отменили сам воркер (остановка сервера) — пробрасываем дальше
+                raise
+        except Exception as e:
+            print(f"An error occurred in job {job.id}: {e}")
+            job.status = FAILED
+            job.error = str(e)
+        finally:
+            job.finished_at = _now()
+            job.task = None
+            await self._persist(job)
+
+    async def _persist(self, job: Job):
+        """Сохраняет прогресс задачи в документ состояния, чтобы он пережил перезапуск."""
+        try:
+            await asyncio.to_thread(set_state, {
+                "processed": job.processed,
+                "total": job.total,
+                "is_running": job.is_active,
+                "finished": not job.is_active,
+                "last_job_id": job.id,
+            }, merge=True)
+        except Exception as e:
+            print(f"Could not persist state of job {job.id}: {e}")
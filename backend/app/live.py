@@ -0,0 +1,165 @@
+# live.py — живой режим: подписка общего клиента Telethon на новые и отредактированные сообщения
+# Новое сообщение проходит тот же путь, что и при выгрузке истории
+# (отбор → скачивание/брендирование → сохранение), а уже сохранённые
+# историческим запуском сообщения повторно не записываются. Альбом приходит
+# отдельным событием (events.Album) и сохраняется одним постом.
+import asyncio
+from datetime import datetime, timezone
+
+from app.config import get_config
+from app.firebase_manager import find_post_by_message, update_post
+from app.messages import MODE_DEFAULT, album_primary, is_allowed
+
+
+class LiveIngestor:
+    """Подписка на каналы. Один экземпляр на процесс сервера."""
+
+    def __init__(self):
+        self.channels: list[str] = []
+        self.media_filter = MODE_DEFAULT
+        self.started_at: datetime | None = None
+        self.counters = self._empty_counters()
+        self._client = None
+        self._handlers: list = []
+        self._chat_to_channel: dict[int, str] = {}
+        self._in_flight: set = set()
+        self._tasks: set = set()
+        self._semaphore: asyncio.Semaphore | None = None
+
+    @staticmethod
+    def _empty_counters() -> dict:
+        return {"received": 0, "saved": 0, "edited": 0, "filtered": 0, "duplicates": 0, "errors": 0}
+
+    @property
+    def is_running(self) -> bool:
+        return bool(self._handlers)
+
+    def status(self) -> dict:
+        return {
+            "is_running": self.is_running,
+            "channels": self.channels,
+            "media_filter": self.media_filter,
+            "started_at": self.started_at,
+            "counters": self.counters,
+        }
+
+    async def start(self, channels: list[str], media_filter: str = MODE_DEFAULT):
+        """Подписывается на каналы; повторный вызов заменяет подписку."""
+        from telethon import events, utils
+        from app.tg_client import get_client
+
+        await self.stop()
+        client = await get_client()
+        chat_to_channel = {}
+        for ch in channels:
+            entity = await client.get_entity(ch)
+            # source_channel постов — строка канала в том виде, как её задали (как в истории)
+            chat_to_channel[utils.get_peer_id(entity)] = ch
+        chats = list(chat_to_channel)
+
+        live_cfg = get_config().get("live") or {}
+        self._semaphore = asyncio.Semaphore(max(1, int(live_cfg.get("concurrency", 4))))
+        self._client = client
+        self._chat_to_channel = chat_to_channel
+        self.channels = list(channels)
+        self.media_filter = media_filter
+        self.started_at = datetime.now(timezone.utc)
+        self.counters = self._empty_counters()
+        self._handlers = [
+            (self._on_new_message, events.NewMessage(chats=chats)),
+            (self._on_album, events.Album(chats=chats)),
+            (self._on_edited_message, events.MessageEdited(chats=chats)),
+        ]
+        for callback, event in self._handlers:
+            client.add_event_handler(callback, event)
+        print(f"Live mode started for {', '.join(channels)}")
+
+    async def stop(self):
+        """Снимает подписку и дожидается сообщений, которые уже в обработке."""
+        if not self._handlers:
+            return
+        for callback, event in self._handlers:
+            self._client.remove_event_handler(callback, event)
+        self._handlers = []
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        print("Live mode stopped")
+
+    async def _on_new_message(self, event):
+        ch = self._chat_to_channel.get(event.chat_id)
+        if ch is None or getattr(event.message, "grouped_id", None):
+            # Сообщения альбома обработает _on_album, когда соберутся все
+            return
+        self.counters["received"] += 1
+        self._spawn(self._ingest(ch, [event.message]))
+
+    async def _on_album(self, event):
+        ch = self._chat_to_channel.get(event.chat_id)
+        if ch is None:
+            return
+        self.counters["received"] += 1
+        self._spawn(self._ingest(ch, list(event.messages)))
+
+    def _spawn(self, coro):
+        # Обработку выносим в отдельную задачу, чтобы не задерживать приём обновлений Telethon
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _ingest(self, ch: str, messages: list):
+        album = sorted((x for x in messages if is_allowed(x, self.media_filter)), key=lambda x: x.id)
+        if not album:
+            self.counters["filtered"] += 1
+            return
+        m = album_primary(album)
+        key = (ch, m.id)
+        if key in self._in_flight:
+            self.counters["duplicates"] += 1
+            return
+        # Помечаем до первого await, чтобы повторная доставка того же сообщения не проскочила
+        self._in_flight.add(key)
+        try:
+            if await asyncio.to_thread(find_post_by_message, ch, m.id):
+                self.counters["duplicates"] += 1
+                return
+            async with self._semaphore:
+                await self._persist(ch, m, album)
+            self.counters["saved"] += 1
+        except Exception as e:
+            self.counters["errors"] += 1
+            print(f"Live ingestion error for message {m.id} of {ch}: {e}")
+        finally:
+            self._in_flight.discard(key)
+
+    async def _persist(self, ch: str, m, album: list):
+        from app.main import build_task_payload, is_queue_mode, process_message
+
+        if is_queue_mode():
+            from app.task_queue import get_task_queue
+            item = {'message': m, 'album': album}
+            await asyncio.to_thread(get_task_queue().enqueue, f"live:{ch}", "process_message", build_task_payload(ch, item, is_top_post=False))
+            return
+        await process_message(self._client, ch, m, album=album)
+
+    async def _on_edited_message(self, event):
+        ch = self._chat_to_channel.get(event.chat_id)
+        if ch is None:
+            return
+        m = event.message
+        post = await asyncio.to_thread(find_post_by_message, ch, m.id)
+        if not post:
+            return
+        content = (m.message or "").strip()
+        if content == post.get("content"):
+            return
+        # Перевод старого текста больше не актуален
+        await asyncio.to_thread(update_post, post["id"], {
+            "content": content,
+            "translated_content": None,
+            "target_lang": None,
+            "edited_at": datetime.now(timezone.utc),
+        })
+        self.counters["edited"] += 1
+
+
+live_ingestor = LiveIngestor()
@@ -1,32 +1,36 @@
-# main.py — ТЕКСТ + МЕДИА одним постом (альбомом), бережная склейка соседних сообщений
-import os, asyncio, yaml, pathlib, shutil, subprocess
+# main.py — ТЕКСТ + МЕДИА одним постом (альбомом): сообщения с общим grouped_id сохраняются вместе
+import os, asyncio, pathlib, shutil, subprocess, uuid
 from datetime import datetime, timedelta
-from dotenv import load_dotenv
-from telethon import TelegramClient
-from telethon.errors import (
-    FloodWaitError,
-)
-from PIL import Image
-from app.state_manager import increment_processed, set_total, get_last_id, set_last_id
+from functools import lru_cache
+from typing import TYPE_CHECKING
+from app.config import get_config
+from app.state_manager import current_job, increment_processed, set_processed, set_total, get_last_id, set_last_id
 from app.firebase_manager import save_post
-# Убираем импорт, так как перевод здесь больше не нужен
-# from app.translation import translate_text
+from app.tg_client import get_client, disconnect_client
+from app.task_queue import get_queue_config, get_task_queue
+from app.pipeline import Stage, run_stages
+from app.messages import MODE_DEFAULT, album_primary, iter_matching
+from app.checkpoints import RunCheckpoint
+from app.dedup import get_dedup_config, get_dedup_index, fingerprint_message
+# Перевод в конвейере необязателен (pipeline.auto_translate): app.translation импортируем только при нём
+
+# Telethon и Pillow тяжёлые — импортируем их только при реальном запуске пайплайна
+if TYPE_CHECKING:
+    from telethon import TelegramClient
 
 # === 0. Ключи и конфиг ===
-load_dotenv()
-TELEGRAM_API_ID = int(os.getenv("TELEGRAM_API_ID"))
-TELEGRAM_API_HASH = os.getenv("TELEGRAM_API_HASH")
-
-# Путь к config.yaml относительно app/
-config_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "config.yaml")
-with open(config_path, "r", encoding="utf-8") as f:
-    CFG = yaml.safe_load(f)
+# config.yaml и .env читаются лениво через app.config (см. get_config/load_env)
 
 # Целевой канал и доставка больше не нужны
 # DEBUG_CFG = CFG.get("debug", {}) or {}
 # MIRROR_TO_ME = bool(DEBUG_CFG.get("mirror_to_me", False))
-OUT = pathlib.Path.home() / "Library" / "Caches" / "tg_pipeline"   # кэш, чтобы не засорять проект
-OUT.mkdir(exist_ok=True, parents=True)
+
+@lru_cache(maxsize=1)
+def get_out_dir() -> pathlib.Path:
+    """Кэш, чтобы не засорять проект. Создаётся при первом обращении."""
+    out = pathlib.Path.home() / "Library" / "Caches" / "tg_pipeline"
+    out.mkdir(exist_ok=True, parents=True)
+    return out
 
 # Логика работы с state.json полностью заменена на Firestore через state_manager.py
 
@@ -36,6 +40,8 @@ def ffmpeg_exists() -> bool:
 
 def add_logo_image(img_path: str, logo_path: str, pos: str="bottom-right", margin: int=24) -> str:
     """Кладём логотип (если есть) и сохраняем в OUT. Возвращаем путь."""
+    from PIL import Image
+    OUT = get_out_dir()
     try:
         src = pathlib.Path(img_path)
         out = OUT / (src.stem + "_branded.png")
@@ -56,6 +62,7 @@ def add_logo_image(img_path: str, logo_path: str, pos: str="bottom-right", margi
 
 def brand_video(video_path: str, logo_path: str) -> str:
     """Логотип на видео через ffmpeg (если есть), иначе просто переложим в OUT."""
+    OUT = get_out_dir()
     src = pathlib.Path(video_path)
     out = OUT / (src.stem + "_branded.mp4")
     if not ffmpeg_exists() or not pathlib.Path(logo_path).exists():
@@ -73,80 +80,304 @@ def brand_video(video_path: str, logo_path: str) -> str:
         if src.resolve() != dst.resolve(): shutil.move(str(src), str(dst))
         return str(dst)
 
-async def download_and_brand(client, message):
-    """Скачать медиа из сообщения и вернуть список путей к обработанным файлам."""
-    paths = []
+async def download_raw(client, message) -> str | None:
+    """Скачать медиа из сообщения как есть. Возвращает путь к файлу или None."""
     if not message.media:
-        return paths
+        return None
     try:
-        raw = await client.download_media(message)
-        if raw:
-            low = raw.lower()
-            if low.endswith((".jpg",".jpeg",".png",".webp",".bmp",".tiff")):
-                paths.append(add_logo_image(raw, CFG["logo"]["path"],
-                                            CFG["logo"]["position"], CFG["logo"]["margin"]))
-                try: os.remove(raw)
-                except: pass
-            elif low.endswith((".mp4",".mov",".mkv",".webm",".m4v")):
-                paths.append(brand_video(raw, CFG["logo"]["path"]))
-            else:
-                dst = OUT / pathlib.Path(raw).name
-                shutil.move(raw, dst); paths.append(str(dst))
+        return await client.download_media(message)
     except Exception as e:
         print("Media download error:", e)
+        return None
+
+def brand_media(raw: str | None) -> list:
+    """Брендировать скачанный файл и вернуть список путей к обработанным файлам.
+
+    Работа с Pillow/ffmpeg блокирующая — в конвейере вызывается через asyncio.to_thread.
+    """
+    paths = []
+    if not raw:
+        return paths
+    logo_cfg = get_config()["logo"]
+    try:
+        low = raw.lower()
+        if low.endswith((".jpg",".jpeg",".png",".webp",".bmp",".tiff")):
+            paths.append(add_logo_image(raw, logo_cfg["path"],
+                                        logo_cfg["position"], logo_cfg["margin"]))
+            try: os.remove(raw)
+            except: pass
+        elif low.endswith((".mp4",".mov",".mkv",".webm",".m4v")):
+            paths.append(brand_video(raw, logo_cfg["path"]))
+        else:
+            dst = get_out_dir() / pathlib.Path(raw).name
+            shutil.move(raw, dst); paths.append(str(dst))
+    except Exception as e:
+        print("Media branding error:", e)
     return paths
 
+async def download_album(client, album: list) -> list:
+    """Скачать медиа всех сообщений поста (альбома) одновременно; пути в порядке альбома."""
+    return list(await asyncio.gather(*(download_raw(client, x) for x in album)))
+
+async def brand_album(raws: list) -> list:
+    """Брендировать файлы альбома параллельно (каждый в своём потоке) и вернуть пути по порядку."""
+    branded = await asyncio.gather(*(asyncio.to_thread(brand_media, raw) for raw in raws))
+    return [path for paths in branded for path in paths]
+
+async def download_and_brand(client, album: list):
+    """Скачать медиа сообщений поста и вернуть список путей к обработанным файлам."""
+    return await brand_album(await download_album(client, album))
+
+# === 1b. Обработка одного поста (сообщения или альбома): скачать → брендировать → сохранить ===
+def album_of(item: dict) -> list:
+    """Сообщения поста: альбом целиком или одно сообщение."""
+    return item.get('album') or [item['message']]
+
+def post_key(item: dict) -> int:
+    """ID, которым пост отмечается в контрольной точке: младший ID альбома.
+
+    Продолжение идёт с offset_id=курсор (сообщения старше него), поэтому курсор на
+    младшем сообщении не даёт перечитать «хвост» уже сохранённого альбома.
+    """
+    return min(x.id for x in album_of(item))
+
+def build_post(ch: str, m, media_paths: list, is_top_post: bool = False, metrics: dict | None = None,
+               translation: tuple | None = None, album: list | None = None) -> dict:
+    """Собирает документ поста для сохранения в хранилище.
+
+    `m` — сообщение, от имени которого сохраняется пост (у альбома — с подписью),
+    `album` — все сообщения альбома, `translation` — (перевод, язык), если пост
+    переведён ещё в конвейере.
+    """
+    metrics = metrics or {}
+    album = album or [m]
+    translated_content, target_lang = translation or (None, None)
+    post = {
+        "source_channel": ch,
+        "original_message_id": m.id,
+        "original_ids": [x.id for x in album],
+        "original_date": m.date,
+        "content": (m.message or "").strip(),
+        "translated_content": translated_content, # Без auto_translate будет заполнено позже
+        "target_lang": target_lang,
+        "has_media": bool(media_paths),
+        "media_count": len(media_paths),
+        "is_merged": len(album) > 1, # Альбом сохраняется одним постом
+        "is_top_post": is_top_post,
+        "original_views": metrics.get('views', max(x.views or 0 for x in album)),
+    }
+    if is_top_post:
+        post["original_likes"] = metrics.get('likes', 0)
+        post["original_comments"] = metrics.get('comments', 0)
+    return post
+
+def cleanup_media(media_paths: list):
+    """Чистим кэш после сохранения."""
+    for p in media_paths:
+        try: pathlib.Path(p).unlink(missing_ok=True)
+        except Exception as e: print("Cleanup error:", e)
+
+# === 1c. Почти-дубликаты (app.dedup): проверяются до скачивания медиа ===
+async def find_duplicate(client, ch: str, m):
+    """Возвращает (отпечаток, найденный почти-дубликат или None); без индекса — (None, None)."""
+    index = get_dedup_index()
+    if index is None:
+        return None, None
+    fingerprint = await fingerprint_message(client, m, int(get_dedup_config().get("min_text_length", 40)))
+    if not fingerprint:
+        return None, None
+    match = await asyncio.to_thread(index.find, fingerprint, ch, m.id)
+    return fingerprint, match
+
+def save_duplicate(ch: str, m, match: dict, fingerprint, is_top_post: bool = False, metrics: dict | None = None,
+                   album: list | None = None):
+    """dedup.action: skip — дубликат не сохраняем; link — сохраняем пост без медиа со ссылкой duplicate_of."""
+    index = get_dedup_index()
+    media_count = sum(1 for x in album or [m] if x.media)
+    if media_count:
+        index.count("downloads_avoided", media_count)
+    if get_dedup_config().get("action", "skip") == "link":
+        post = build_post(ch, m, [], is_top_post=is_top_post, metrics=metrics, album=album)
+        post["duplicate_of"] = match["post_id"]
+        # Отпечаток пишем и для ссылки: по нему найдутся следующие репосты этого текста
+        remember_post(save_post(post), ch, m, fingerprint)
+        index.count("linked")
+        print(f"Post id={m.id} is a near-duplicate of {match['post_id']} ({match['kind']}, distance {match['distance']}), linked.")
+    else:
+        index.count("skipped")
+        print(f"Post id={m.id} is a near-duplicate of {match['post_id']} ({match['kind']}, distance {match['distance']}), skipped.")
+
+def remember_post(post_id: str | None, ch: str, m, fingerprint):
+    """Заносит отпечаток сохранённого поста в индекс дубликатов."""
+    index = get_dedup_index()
+    if index is None or not post_id or not fingerprint:
+        return
+    try:
+        index.add(post_id, ch, m.id, fingerprint)
+    except Exception as e:
+        print(f"Could not index post {post_id} for dedup: {e}")
+
+# === 1d. Перевод в конвейере: пост сохраняется уже переведённым ===
+def get_auto_translate_lang() -> str | None:
+    """Язык перевода (target_lang), если включён pipeline.auto_translate; иначе None."""
+    cfg = get_config()
+    if not (cfg.get("pipeline") or {}).get("auto_translate", False):
+        return None
+    return cfg.get("target_lang") or None
+
+async def translate_message(m, target_lang: str | None) -> tuple | None:
+    """Переводит текст сообщения; возвращает (перевод, язык) для build_post или None."""
+    text = (m.message or "").strip()
+    if not target_lang or not text:
+        return None
+    from app.translation import translate_text
+    try:
+        return await translate_text(text, target_lang), target_lang
+    except Exception as e:
+        # Пост сохранится без перевода — его можно перевести вручную позже
+        print(f"Auto-translation error for message {m.id}: {e}")
+        return None
+
+class PostNotSavedError(RuntimeError):
+    """save_post не записал пост (ошибка хранилища уже выведена в лог)."""
+
+async def process_message(client, ch: str, m, is_top_post: bool = False, metrics: dict | None = None,
+                          album: list | None = None):
+    """Полная обработка одного поста. Используется и в процессе сервера, и воркером.
+
+    `album` — все сообщения альбома (`m` среди них — с подписью): их медиа качаются
+    одновременно, а сохраняется один пост. Если пост не удалось записать в хранилище,
+    поднимается PostNotSavedError — воркер вернёт задачу в очередь.
+    """
+    album = album or [m]
+    fingerprint, match = await find_duplicate(client, ch, m)
+    if match:
+        await asyncio.to_thread(save_duplicate, ch, m, match, fingerprint, is_top_post, metrics, album)
+        return
+    # Перевод идёт одновременно со скачиванием и брендированием медиа
+    media_paths, translation = await asyncio.gather(
+        download_and_brand(client, album),
+        translate_message(m, get_auto_translate_lang()),
+    )
+    try:
+        # --- Сохраняем пост (вместе с переводом и всеми медиа альбома, одной записью) ---
+        post_id = save_post(build_post(ch, m, media_paths, is_top_post=is_top_post, metrics=metrics,
+                                       translation=translation, album=album))
+        if post_id is None:
+            raise PostNotSavedError(f"Post id={m.id} of {ch} was not saved")
+        remember_post(post_id, ch, m, fingerprint)
+        # --- ОТПРАВКА В TELEGRAM ОТКЛЮЧЕНА ---
+        print(f"Post id={m.id} saved. Skipping Telegram send.")
+    finally:
+        cleanup_media(media_paths)
+
+def is_queue_mode() -> bool:
+    """pipeline.execution: queue — обработку выполняют воркеры (python -m app.worker)."""
+    return (get_config().get("pipeline") or {}).get("execution", "inline") == "queue"
+
+async def dispatch_messages(client, ch: str, items: list, is_top_post: bool = False, checkpoint: RunCheckpoint | None = None):
+    """Обрабатывает отобранные сообщения на месте или отдаёт их воркерам через очередь."""
+    if is_queue_mode():
+        await enqueue_and_wait(ch, items, is_top_post=is_top_post)
+        return
+
+    # При продолжении запуска уже сохранённые сообщения пропускаем (они учтены в processed)
+    done_ids = checkpoint.channel(ch).persisted_ids if checkpoint else set()
+    for item in items:
+        # На каждой итерации даём возможность циклу событий обработать отмену
+        await asyncio.sleep(0)
+        if post_key(item) in done_ids:
+            continue
+        metrics = {k: item[k] for k in ('likes', 'comments', 'views') if k in item}
+        try:
+            await process_message(client, ch, item['message'], is_top_post=is_top_post, metrics=metrics, album=album_of(item))
+        except PostNotSavedError as e:
+            # Запуск продолжается; сообщение не отмечено в контрольной точке, продолжение попробует снова
+            print(f"{e}, skipping")
+            continue
+        increment_processed() # Увеличиваем счетчик после успешной обработки
+        if checkpoint:
+            await checkpoint.mark_persisted(ch, post_key(item))
+
+def _batch_id(ch: str) -> str:
+    job = current_job.get()
+    return f"{job.id if job else uuid.uuid4().hex[:12]}:{ch}"
+
+def build_task_payload(ch: str, item: dict, is_top_post: bool) -> dict:
+    return {
+        "channel": ch,
+        "message_id": item['message'].id,
+        # Воркер запросит все сообщения альбома одним вызовом
+        "album_ids": [x.id for x in album_of(item)],
+        "is_top_post": is_top_post,
+        "metrics": {k: item[k] for k in ('likes', 'comments', 'views') if k in item},
+    }
+
+async def enqueue_and_wait(ch: str, items: list, is_top_post: bool = False):
+    """Кладёт сообщения в очередь и ждёт, пока воркеры их обработают, обновляя прогресс."""
+    batch_id = _batch_id(ch)
+    payloads = [build_task_payload(ch, item, is_top_post) for item in items]
+    # Очередь — SQLite с ожиданием блокировки до 30 с: вызовы уносим из цикла событий
+    await asyncio.to_thread(get_task_queue().enqueue_many, batch_id, "process_message", payloads)
+    print(f"Enqueued {len(items)} messages of {ch} as batch {batch_id}")
+    await wait_for_batch(batch_id)
+
+async def wait_for_batch(batch_id: str):
+    """Ждёт, пока воркеры обработают пакет; при отмене снимает его задачи с очереди."""
+    queue = get_task_queue()
+    poll_interval = float(get_queue_config().get("poll_interval", 1.0))
+    try:
+        while True:
+            counts = await asyncio.to_thread(queue.batch_counts, batch_id)
+            set_processed(counts["done"] + counts["failed"])
+            if counts["queued"] == 0 and counts["running"] == 0:
+                break
+            await asyncio.sleep(poll_interval)
+    except asyncio.CancelledError:
+        cancelled = await asyncio.to_thread(queue.cancel_batch, batch_id)
+        print(f"Cancelled {cancelled} queued tasks of batch {batch_id}")
+        raise
+    if counts["failed"]:
+        print(f"{counts['failed']} tasks of batch {batch_id} failed")
+
 # === 2a. Выбор топ-постов за период по метрикам ===
-async def process_top_posts(client: TelegramClient, ch: str, period_days: float, top_counts: dict, desired_total: int | None = None):
+async def process_top_posts(client: "TelegramClient", ch: str, period_days: float, top_counts: dict, desired_total: int | None = None, media_filter: str = MODE_DEFAULT, checkpoint: RunCheckpoint | None = None):
     print(f"== Top posts mode: channel {ch}, period_days={period_days}, counts={top_counts}")
     entity = await client.get_entity(ch)
     # Поддерживаем дробные дни (например, 0.5 дня = 12 часов)
     days_span = max(0.001, float(period_days))
     since_dt = datetime.utcnow() - timedelta(days=days_span)
 
-    # Собираем сообщения за период
+    # Собираем посты за период (видео/GIF отсекает общий классификатор); альбом — один пост
     collected = []
-    async for m in client.iter_messages(entity, limit=2000):
-        if m.date.tzinfo:
-            msg_dt = m.date.replace(tzinfo=None)
-        else:
-            msg_dt = m.date
-        if msg_dt < since_dt:
-            break
-
-        # Пропускаем видео/GIF
-        media = getattr(m, "media", None)
-        doc = getattr(media, "document", None) if media else None
-        mime = (getattr(doc, "mime_type", "") or "").lower() if doc else ""
-        attrs = getattr(doc, "attributes", []) or []
-        is_animated = any(getattr(a, "animated", False) or a.__class__.__name__ == "DocumentAttributeAnimated" for a in attrs)
-        if (mime.startswith("video") or mime == "image/gif" or is_animated):
-            continue
-
-        # Считываем реакции и просмотры (если доступны)
+    async for album in iter_matching(client, entity, mode=media_filter, max_scan=2000, since=since_dt, albums=True):
+        # Считываем реакции и просмотры (если доступны); у альбома реакции и комментарии
+        # складываются по сообщениям, просмотры — максимальные
         likes = 0
-        comments = int(getattr(m, 'replies', None).replies if getattr(m, 'replies', None) else 0)
-        views = int(getattr(m, 'views', 0) or 0)
-
-        try:
-            r = getattr(m, 'reactions', None)
-            if r and getattr(r, 'results', None):
-                for res in r.results:
-                    emoji = getattr(res, 'reaction', None)
-                    count = int(getattr(res, 'count', 0) or 0)
-                    # Считаем любые реакции как лайки, либо фильтровать по \u2764\ufe0f
-                    likes += count
-        except Exception:
-            pass
+        comments = sum(int(getattr(m, 'replies', None).replies if getattr(m, 'replies', None) else 0) for m in album)
+        views = max(int(getattr(m, 'views', 0) or 0) for m in album)
+
+        for m in album:
+            try:
+                r = getattr(m, 'reactions', None)
+                if r and getattr(r, 'results', None):
+                    for res in r.results:
+                        emoji = getattr(res, 'reaction', None)
+                        count = int(getattr(res, 'count', 0) or 0)
+                        # Считаем любые реакции как лайки, либо фильтровать по \u2764\ufe0f
+                        likes += count
+            except Exception:
+                pass
 
         collected.append({
-            'message': m,
+            'message': album_primary(album),
+            'album': album,
             'likes': likes,
             'comments': comments,
             'views': views,
         })
 
-    print(f"Collected {len(collected)} messages in period for {ch}")
+    print(f"Collected {len(collected)} posts in period for {ch}")
 
     # Сортировки и выбор топов с гарантией квот и без дублей
     def sorted_by(key: str):
@@ -191,21 +422,16 @@ async def process_top_posts(client: TelegramClient, ch: str, period_days: float,
     # Второй фолбэк: если и после добора по периоду пусто, берём последние текстовые посты без ограничения периода
     if not unique_msgs:
         print("Fallback by date yielded 0 messages, expanding search window (ignore period)...")
-        async for m2 in client.iter_messages(entity, limit=500):
-            media = getattr(m2, "media", None)
-            doc = getattr(media, "document", None) if media else None
-            mime = (getattr(doc, "mime_type", "") or "").lower() if doc else ""
-            attrs = getattr(doc, "attributes", []) or []
-            is_animated = any(getattr(a, "animated", False) or a.__class__.__name__ == "DocumentAttributeAnimated" for a in attrs)
-            if (mime.startswith("video") or mime == "image/gif" or is_animated):
-                continue
-            
+        fallback_limit = desired_total if isinstance(desired_total, int) and desired_total > 0 else None
+        async for album in iter_matching(client, entity, mode=media_filter, limit=fallback_limit, max_scan=500, albums=True):
             # Оборачиваем в совместимую структуру
+            m2 = album_primary(album)
             unique_msgs.append({
                 'message': m2,
+                'album': album,
                 'likes': 0,
                 'comments': int(getattr(m2, 'replies', None).replies if getattr(m2, 'replies', None) else 0),
-                'views': int(getattr(m2, 'views', 0) or 0),
+                'views': max(int(getattr(m, 'views', 0) or 0) for m in album),
             })
 
             if isinstance(desired_total, int) and desired_total > 0 and len(unique_msgs) >= desired_total:
@@ -218,128 +444,164 @@ async def process_top_posts(client: TelegramClient, ch: str, period_days: float,
 
     # Отправляем в целевой канал, соблюдая текущие правила склейки/медиа
     # Здесь без склейки; отправляем как есть
-    for item in unique_msgs:
-        m = item['message']
-        caption = (m.message or "").strip()
-        media_paths = await download_and_brand(client, m)
-        
-        # --- Собираем данные для сохранения в Firestore ---
-        post_to_save = {
-            "source_channel": ch,
-            "original_message_id": m.id,
-            "original_ids": [m.id],
-            "original_date": m.date,
-            "content": caption,
-            "translated_content": None, # Будет заполнено позже
-            "target_lang": None,      # Будет заполнено позже
-            "has_media": bool(media_paths),
-            "media_count": len(media_paths),
-            "is_merged": False,
-            "is_top_post": True,
-            "original_views": item.get('views', 0),
-            "original_likes": item.get('likes', 0),
-            "original_comments": item.get('comments', 0),
-        }
-        save_post(post_to_save)
-
-        # --- ОТПРАВКА В TELEGRAM ОТКЛЮЧЕНА ---
-        print(f"Post id={m.id} saved to Firestore. Skipping Telegram send.")
-
-        # Чистим кэш после сохранения
-        for p in media_paths:
-            try: pathlib.Path(p).unlink(missing_ok=True)
-            except Exception as e: print("Cleanup error:", e)
-
-        increment_processed()
+    await dispatch_messages(client, ch, unique_msgs, is_top_post=True, checkpoint=checkpoint)
 
 # === 2. Основная логика ===
-async def process_channel(client: TelegramClient, ch: str, limit: int):
+def get_stage_config() -> dict:
+    """Настройки конвейера из config.yaml -> pipeline (размер очередей и параллелизм стадий)."""
+    cfg = get_config().get("pipeline") or {}
+    concurrency = cfg.get("concurrency") or {}
+    return {
+        "queue_size": int(cfg.get("queue_size", 8)),
+        "max_scan": int(cfg.get("max_scan", 5000)),
+        "download": int(concurrency.get("download", 4)),
+        "brand": int(concurrency.get("brand", 2)),
+        "persist": int(concurrency.get("persist", 2)),
+        "translate": int(concurrency.get("translate", 4)),
+    }
+
+async def process_channel(client: "TelegramClient", ch: str, limit: int, media_filter: str = MODE_DEFAULT, checkpoint: RunCheckpoint | None = None):
+    """Потоковая обработка канала: fetch → filter → download → brand → persist → progress.
+
+    Стадии работают одновременно и связаны ограниченными очередями (app.pipeline),
+    поэтому первый пост сохраняется, пока история ещё догружается, а память не
+    зависит от `limit`. Посты сохраняются от новых к старым. Альбом (сообщения с
+    общим grouped_id) идёт по конвейеру одним элементом и считается одним постом.
+
+    С контрольной точкой (app.checkpoints) прогресс канала записывается по ходу
+    работы, а продолжение запуска начинается с курсора и не сохраняет посты повторно.
+    """
+    progress = checkpoint.channel(ch) if checkpoint else None
+    if progress and progress.done:
+        print(f"== Channel: {ch} already processed, skipping")
+        return
     print(f"== Channel: {ch}")
     entity = await client.get_entity(ch)
     # last_id = get_last_id(ch) # Проверка на дубликаты отключена
+    stage_cfg = get_stage_config()
+    queue_mode = is_queue_mode()
+    batch_id = _batch_id(ch) if queue_mode else None
+    target_lang = get_auto_translate_lang()
+
+    # Точное количество станет известно после фильтрации; до этого показываем лимит
+    set_total(limit)
+    # Сообщения новее курсора уже сохранены прошлым запуском — продолжаем сразу после него
+    passed = progress.passed_before_cursor if progress else 0
+    offset_id = progress.cursor if progress else 0
+    done_ids = set(progress.persisted_ids) if progress else set()
+    if passed or done_ids:
+        print(f"Resuming {ch} from message id={offset_id}: {passed + len(done_ids)} posts already saved")
+
+    # Запрашиваем последние посты без учета min_id: отбор (видео/GIF, режим media_filter)
+    # делает iter_matching, догружая историю ровно до `limit` прошедших постов
+    fetch = iter_matching(client, entity, mode=media_filter, limit=max(0, limit - passed),
+                          max_scan=stage_cfg["max_scan"], offset_id=offset_id, albums=True)
+
+    async def filter_stage(album):
+        nonlocal passed
+        if passed >= limit:  # Останавливаемся когда набрали нужное количество
+            return None
+        passed += 1
+        item = {'message': album_primary(album), 'album': album}
+        if progress and not queue_mode:
+            progress.mark_passed(post_key(item))
+            if post_key(item) in done_ids:
+                # Сохранено до остановки, но позже курсора: только сдвигаем курсор
+                await checkpoint.mark_persisted(ch, post_key(item))
+                return None
+        return item
+
+    async def dedup_stage(item):
+        m = item['message']
+        item['fingerprint'], match = await find_duplicate(client, ch, m)
+        if not match:
+            return item
+        # Дубликат дальше не идёт: скачивание и брендирование не нужны
+        await asyncio.to_thread(save_duplicate, ch, m, match, item['fingerprint'], False, None, item['album'])
+        increment_processed()
+        if checkpoint:
+            await checkpoint.mark_persisted(ch, post_key(item))
+        return None
 
-    # Запрашиваем последние N постов без учета min_id
-    all_msgs = [m async for m in client.iter_messages(entity, limit=limit*2)]  # Берём больше для фильтрации
-    if not all_msgs:
-        print(f"No messages found for {ch}")
-        set_total(0)
-        return
-
-    # Фильтруем сообщения, исключая видео/GIF
-    filtered_msgs = []
-    for m in all_msgs:
-        try:
-            media = getattr(m, "media", None)
-            doc = getattr(media, "document", None) if media else None
-            mime = (getattr(doc, "mime_type", "") or "").lower() if doc else ""
-            attrs = getattr(doc, "attributes", []) or []
-            is_animated = any(getattr(a, "animated", False) or a.__class__.__name__ == "DocumentAttributeAnimated" for a in attrs)
-            if not (mime.startswith("video") or mime == "image/gif" or is_animated):
-                filtered_msgs.append(m)
-                if len(filtered_msgs) >= limit:  # Останавливаемся когда набрали нужное количество
-                    break
-        except Exception:
-            # В случае ошибки определения типа медиа включаем сообщение
-            filtered_msgs.append(m)
-            if len(filtered_msgs) >= limit:
-                break
-
-    msgs = filtered_msgs
-    set_total(len(msgs)) # Устанавливаем количество только отфильтрованных сообщений
-    msgs.reverse()  # от старых к новым
+    async def translate_stage(item):
+        item['translation'] = await translate_message(item['message'], target_lang)
+        return item
 
-    for m in msgs:
-        # На каждой итерации даём возможность циклу событий обработать отмену
-        await asyncio.sleep(0)
+    async def download_stage(item):
+        # Медиа альбома качаются одновременно
+        item['raw'] = await download_album(client, item['album'])
+        return item
 
-        # Сообщения уже отфильтрованы, дополнительная проверка не нужна
-
-        text = (m.message or "").strip()
-        media_paths = await download_and_brand(client, m)
-
-        # --- Логика склейки полностью удалена ---
-
-        # --- Собираем данные для сохранения в Firestore ---
-        caption = (text or "").strip()
-
-        post_to_save = {
-            "source_channel": ch,
-            "original_message_id": m.id,
-            "original_ids": [m.id], # Теперь всегда один ID
-            "original_date": m.date,
-            "content": caption,
-            "translated_content": None, # Будет заполнено позже
-            "target_lang": None,      # Будет заполнено позже
-            "has_media": bool(media_paths),
-            "media_count": len(media_paths),
-            "is_merged": False, # Склейка отключена
-            "is_top_post": False,
-            "original_views": m.views or 0,
-        }
-        
-        # --- Сохраняем пост и чистим медиа ---
-        save_post(post_to_save)
+    async def brand_stage(item):
+        item['media_paths'] = await brand_album(item['raw'])
+        return item
 
-        # --- ОТПРАВКА В TELEGRAM ОТКЛЮЧЕНА ---
-        # Теперь только чистим кэш после сохранения
-        for p in media_paths:
-            try: pathlib.Path(p).unlink(missing_ok=True)
-            except Exception as e: print("Cleanup error:", e)
-
-        # Обновление last_id больше не требуется
-        # current_last_id = get_last_id(ch)
-        # set_last_id(ch, max(current_last_id, m.id))
+    async def persist_stage(item):
+        m = item['message']
+        try:
+            post = build_post(ch, m, item['media_paths'], translation=item.get('translation'), album=item['album'])
+            post_id = await asyncio.to_thread(save_post, post)
+            if post_id is None:
+                # Как в dispatch_messages: не считаем и не отмечаем в контрольной точке — продолжение попробует снова
+                print(f"Post id={m.id} of {ch} was not saved, skipping")
+                return None
+            await asyncio.to_thread(remember_post, post_id, ch, m, item.get('fingerprint'))
+            print(f"Post id={m.id} saved. Skipping Telegram send.")
+        finally:
+            cleanup_media(item['media_paths'])
+        if checkpoint:
+            await checkpoint.mark_persisted(ch, post_key(item))
+        return item
+
+    async def progress_stage(item):
         increment_processed() # Увеличиваем счетчик после успешной обработки
-
-async def main(limit: int = 100, period_hours: int | None = None, channel_url: str | None = None, is_top_posts: bool = False):
-    """Основная функция, теперь принимает лимит постов, канал и режим парсинга."""
-    # Путь к session файлу в backend/
-    session_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "session")
-    client = TelegramClient(session_path, TELEGRAM_API_ID, TELEGRAM_API_HASH)
+        return None
+
+    async def enqueue_stage(item):
+        await asyncio.to_thread(get_task_queue().enqueue, batch_id, "process_message", build_task_payload(ch, item, is_top_post=False))
+        return None
+
+    if queue_mode:
+        # Скачивание и сохранение делают воркеры; здесь только отбор и постановка в очередь
+        stages = [Stage("filter", filter_stage), Stage("enqueue", enqueue_stage)]
+    else:
+        stages = [Stage("filter", filter_stage)]
+        if get_dedup_index() is not None:
+            # Миниатюры для отпечатков качаются по сети — параллелим как скачивание
+            stages.append(Stage("dedup", dedup_stage, stage_cfg["download"]))
+        if target_lang:
+            # Переводы идут параллельно со скачиванием и брендированием других сообщений
+            stages.append(Stage("translate", translate_stage, stage_cfg["translate"]))
+        stages += [
+            Stage("download", download_stage, stage_cfg["download"]),
+            Stage("brand", brand_stage, stage_cfg["brand"]),
+            Stage("persist", persist_stage, stage_cfg["persist"]),
+            Stage("progress", progress_stage),
+        ]
+    await run_stages(fetch, stages, queue_size=stage_cfg["queue_size"])
+
+    if not passed:
+        print(f"No messages found for {ch}")
+    set_total(passed) # Устанавливаем количество только отфильтрованных сообщений
+    if queue_mode:
+        print(f"Enqueued {passed} messages of {ch} as batch {batch_id}")
+        await wait_for_batch(batch_id)
+    if checkpoint:
+        await checkpoint.finish_channel(ch)
+
+async def main(limit: int = 100, period_hours: int | None = None, channel_url: str | None = None, is_top_posts: bool = False, media_filter: str = MODE_DEFAULT, checkpoint: RunCheckpoint | None = None):
+    """Основная функция, теперь принимает лимит постов, канал и режим парсинга.
+
+    Работает через общий клиент Telethon (app.tg_client), поэтому несколько запусков
+    могут идти параллельно; соединение закрывает владелец процесса.
+    `checkpoint` — контрольная точка запуска: по ней продолжается прерванный запуск.
+    """
+    CFG = get_config()
     try:
-        await client.start()
-        me = await client.get_me()
-        print(f"Started session as {me.username or me.first_name}.")
+        if checkpoint:
+            # Уже сохранённые прошлым запуском посты сразу учитываем в прогрессе
+            set_processed(checkpoint.persisted_count)
+        client = await get_client()
         
         # Определяем список каналов
         channels = [channel_url] if channel_url else CFG["channels"]
@@ -356,18 +618,26 @@ async def main(limit: int = 100, period_hours: int | None = None, channel_url: s
                 period_days = max(0.0417, float(period_hours) / 24.0)
             counts = top_cfg.get("top_by") or {"likes": 2, "comments": 2, "views": 2}
             for ch in channels:
-                await process_top_posts(client, ch, period_days=period_days, top_counts=counts, desired_total=limit)
+                if checkpoint and checkpoint.channel(ch).done:
+                    continue
+                await process_top_posts(client, ch, period_days=period_days, top_counts=counts, desired_total=limit, media_filter=media_filter, checkpoint=checkpoint)
+                if checkpoint:
+                    await checkpoint.finish_channel(ch)
         else:
             for ch in channels:
-                await process_channel(client, ch, limit=limit)
+                await process_channel(client, ch, limit=limit, media_filter=media_filter, checkpoint=checkpoint)
     except asyncio.CancelledError:
-        print("Main task was cancelled. Disconnecting...")
+        print("Main task was cancelled.")
         # Это исключение возникнет при нажатии "Остановить"
     finally:
-        if client.is_connected():
-            await client.disconnect()
         print("Done.")
 
+async def _cli(limit: int):
+    try:
+        await main(limit=limit)
+    finally:
+        await disconnect_client()
+
 if __name__ == "__main__":
     # Теперь при прямом запуске можно указать лимит
-    asyncio.run(main(limit=100))
+    asyncio.run(_cli(limit=100))
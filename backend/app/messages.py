@@ -0,0 +1,142 @@
+# messages.py — классификация сообщений Telegram и ленивая выборка с фильтрами
+# Одно место, где решается, какие сообщения пайплайн берёт (раньше проверка
+# на видео/GIF была скопирована в main.py трижды).
+import math
+from datetime import datetime
+
+TEXT = "text"
+PHOTO = "photo"
+VIDEO = "video"
+GIF = "gif"
+DOCUMENT = "document"
+OTHER = "other"
+
+# Режимы отбора для /run (поле media_filter)
+MODE_DEFAULT = "default"   # всё, кроме видео/GIF
+MODE_PHOTOS = "photos"     # только фото — фильтр на стороне Telegram
+MODE_TEXT = "text"         # только текст без медиа — у Telegram нет такого фильтра, отбираем у себя
+MEDIA_FILTER_MODES = (MODE_DEFAULT, MODE_PHOTOS, MODE_TEXT)
+
+# Telegram отдаёт историю страницами не больше 100 сообщений
+MAX_CHUNK_SIZE = 100
+
+
+def classify_message(m) -> str:
+    """Возвращает тип содержимого сообщения: text, photo, video, gif, document или other."""
+    media = getattr(m, "media", None)
+    if not media or getattr(media, "webpage", None) is not None:
+        # Превью ссылки — это текстовый пост
+        return TEXT
+    doc = getattr(media, "document", None)
+    if doc is not None:
+        mime = (getattr(doc, "mime_type", "") or "").lower()
+        attrs = getattr(doc, "attributes", []) or []
+        is_animated = any(getattr(a, "animated", False) or a.__class__.__name__ == "DocumentAttributeAnimated" for a in attrs)
+        if mime == "image/gif" or is_animated:
+            return GIF
+        if mime.startswith("video"):
+            return VIDEO
+        return DOCUMENT
+    if getattr(media, "photo", None) is not None:
+        return PHOTO
+    return OTHER
+
+
+def is_allowed(m, mode: str = MODE_DEFAULT) -> bool:
+    """Проходит ли сообщение отбор в заданном режиме."""
+    try:
+        kind = classify_message(m)
+    except Exception:
+        # В случае ошибки определения типа медиа включаем сообщение
+        return mode == MODE_DEFAULT
+    if mode == MODE_PHOTOS:
+        return kind == PHOTO
+    if mode == MODE_TEXT:
+        return kind == TEXT and bool((getattr(m, "message", "") or "").strip())
+    return kind not in (VIDEO, GIF)
+
+
+def server_filter(mode: str):
+    """Фильтр Telegram (InputMessagesFilter*) для режима, если он есть; иначе None."""
+    if mode == MODE_PHOTOS:
+        from telethon.tl.types import InputMessagesFilterPhotos
+        return InputMessagesFilterPhotos()
+    return None
+
+
+def _naive(dt: datetime) -> datetime:
+    return dt.replace(tzinfo=None) if dt.tzinfo else dt
+
+
+def album_primary(messages: list):
+    """Сообщение альбома, от имени которого сохраняется пост: с подписью, иначе первое."""
+    ordered = sorted(messages, key=lambda m: m.id)
+    return next((m for m in ordered if (getattr(m, "message", "") or "").strip()), ordered[0])
+
+
+async def iter_matching(client, entity, mode: str = MODE_DEFAULT, limit: int | None = None,
+                        max_scan: int = 5000, since: datetime | None = None, offset_id: int = 0,
+                        albums: bool = False):
+    """Лениво отдаёт сообщения канала (от новых к старым), прошедшие отбор.
+
+    История запрашивается страницами; размер следующей страницы подбирается по
+    доле уже прошедших фильтр сообщений, чтобы добрать ровно `limit` и не тянуть
+    лишнего. Где возможно, фильтр применяет сам Telegram. Останавливается на
+    `limit` отобранных, `max_scan` просмотренных или на сообщении старше `since`.
+
+    С `albums=True` отдаёт посты — списки сообщений: отобранные сообщения одного
+    альбома (общий grouped_id, по возрастанию id) или одно сообщение; `limit`
+    тогда считает посты. Сообщения альбома в истории идут подряд, поэтому альбом
+    отдаётся, как только встречается сообщение не из него.
+    """
+    tg_filter = server_filter(mode)
+    since = _naive(since) if since else None
+    scanned = 0
+    matched = 0
+    album: list = []
+    album_id = None
+    while scanned < max_scan:
+        if limit is not None:
+            left = limit - matched
+            if left <= 0:
+                return
+            pass_rate = matched / scanned if scanned else 1.0
+            chunk = math.ceil(left / max(pass_rate, 0.05) * 1.2) if scanned else left
+        else:
+            chunk = MAX_CHUNK_SIZE
+        chunk = max(1, min(MAX_CHUNK_SIZE, chunk, max_scan - scanned))
+
+        got = 0
+        reached_since = False
+        async for m in client.iter_messages(entity, limit=chunk, offset_id=offset_id, filter=tg_filter):
+            got += 1
+            offset_id = m.id
+            if since and _naive(m.date) < since:
+                reached_since = True
+                break
+            grouped_id = getattr(m, "grouped_id", None) if albums else None
+            if album and grouped_id != album_id:
+                matched += 1
+                yield sorted(album, key=lambda x: x.id)
+                album = []
+                if limit is not None and matched >= limit:
+                    return
+            allowed = tg_filter is not None or is_allowed(m, mode)
+            if grouped_id is not None:
+                # Альбом может продолжиться на следующей странице — копим до первого чужого сообщения
+                album_id = grouped_id
+                if allowed:
+                    album.append(m)
+                continue
+            album_id = None
+            if allowed:
+                matched += 1
+                yield [m] if albums else m
+                if limit is not None and matched >= limit:
+                    return
+        scanned += got
+        if reached_since or got < chunk:
+            # История кончилась (или дошли до начала периода)
+            break
+    if album:
+        yield sorted(album, key=lambda x: x.id)
@@ -0,0 +1,77 @@
+# migrations.py — одноразовые миграции данных
+# Каждая миграция выполняется один раз: факт выполнения записывается в хранилище
+# (pipeline_state/migrations) и в локальный файл-маркер, поэтому повторные старты
+# (в том числе с --reload) не ходят в сеть вообще. Маркер ведётся отдельно для
+# каждой базы (app.storage.storage_key): смена storage.backend или пути к SQLite
+# снова проверит и применит миграции в новой базе.
+import json
+import os
+
+from app.config import BASE_DIR
+from app.firebase_manager import cleanup_old_channels_collection, get_migrations_document, mark_migration_done
+from app.storage import storage_key
+
+# MIGRATIONS_MARKER_PATH — для временных баз (нагрузочный тест), чтобы не засорять общий маркер
+MARKER_PATH = os.getenv("MIGRATIONS_MARKER_PATH") or os.path.join(BASE_DIR, ".migrations.json")
+
+# Порядок важен: миграции применяются сверху вниз
+MIGRATIONS = [
+    ("cleanup_old_saved_channels", cleanup_old_channels_collection),
+]
+
+
+def _read_marker() -> dict:
+    try:
+        with open(MARKER_PATH, "r", encoding="utf-8") as f:
+            marker = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if isinstance(marker, list):
+        # Старый формат — общий список; он писался, когда хранилищем был только Firestore
+        return {"firestore": marker}
+    return marker if isinstance(marker, dict) else {}
+
+
+def _load_local_marker() -> set:
+    return set(_read_marker().get(storage_key(), []))
+
+
+def _save_local_marker(done: set):
+    marker = _read_marker()
+    marker[storage_key()] = sorted(done)
+    try:
+        with open(MARKER_PATH, "w", encoding="utf-8") as f:
+            json.dump(marker, f, indent=2)
+    except OSError as e:
+        print(f"Could not write migrations marker: {e}")
+
+
+def pending_migrations() -> list:
+    """Возвращает миграции, не отмеченные в локальном маркере для текущей базы (без сетевых запросов)."""
+    done = _load_local_marker()
+    return [(name, fn) for name, fn in MIGRATIONS if name not in done]
+
+
+def run_pending_migrations():
+    """Применяет невыполненные миграции и записывает их как выполненные."""
+    pending = pending_migrations()
+    if not pending:
+        return
+
+    done = _load_local_marker()
+    try:
+        applied_remotely = get_migrations_document()
+    except Exception as e:
+        print(f"Could not read migrations document: {e}")
+        return
+
+    for name, fn in pending:
+        if name not in applied_remotely:
+            print(f"Applying migration '{name}'...")
+            if not fn():
+                print(f"Migration '{name}' failed, will retry on next start")
+                continue
+            mark_migration_done(name)
+        done.add(name)
+
+    _save_local_marker(done)
@@ -0,0 +1,309 @@
+# openai_governor.py — регулятор запросов к OpenAI
+# Все запросы перевода проходят через один объект на процесс:
+#   * два «ведра токенов» — запросы в минуту (RPM) и токены в минуту (TPM);
+#     лимиты берутся из заголовков ответа x-ratelimit-*, а до первого ответа — из config.yaml;
+#   * повтор с экспоненциальной задержкой и случайным разбросом (jitter) на 429,
+#     5xx, таймаутах и обрывах соединения; 429 приостанавливает и остальные запросы;
+#   * таймаут запроса и «предохранитель» (circuit breaker): после серии неудач
+#     запросы какое-то время сразу отклоняются, не нагружая API.
+# Ошибки не глотаются: вызывающий код получает исключение и сам решает, что делать.
+import asyncio
+import random
+import re
+import time
+
+from app.config import get_config
+
+# Заголовки лимитов OpenAI
+_LIMIT_REQUESTS = "x-ratelimit-limit-requests"
+_LIMIT_TOKENS = "x-ratelimit-limit-tokens"
+_REMAINING_REQUESTS = "x-ratelimit-remaining-requests"
+_REMAINING_TOKENS = "x-ratelimit-remaining-tokens"
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+class GovernorError(Exception):
+    """Запрос к OpenAI не выполнен регулятором (лимиты, повторы, предохранитель)."""
+
+
+class CircuitOpenError(GovernorError):
+    """Предохранитель разомкнут: API недавно много раз подряд отвечал ошибками."""
+
+
+class RetriesExhaustedError(GovernorError):
+    """Все повторы запроса закончились ошибкой."""
+
+
+def parse_duration(value: str | None) -> float | None:
+    """'1s', '6m0s', '250ms' или просто число секунд -> секунды."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_RE.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def _int_header(headers, name: str) -> int | None:
+    try:
+        return int(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Ведро токенов с лимитом «в минуту»; вмещает burst_seconds секунд лимита."""
+
+    def __init__(self, per_minute: float, burst_seconds: float = 10):
+        self.burst_seconds = burst_seconds
+        self.level = 0.0
+        self.set_limit(per_minute)
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def set_limit(self, per_minute: float):
+        self.per_minute = max(1.0, float(per_minute))
+        self.rate = self.per_minute / 60
+        self.capacity = max(1.0, self.rate * self.burst_seconds)
+        self.level = min(self.level, self.capacity)
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Сколько секунд ждать, пока в ведре наберётся `amount` (не больше его ёмкости)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        # Уровень может уйти в минус: так учитывается перерасход, выяснившийся после ответа
+        self._refill()
+        self.level -= amount
+
+    def sync_remaining(self, remaining: int):
+        """Остаток по данным сервера: с ним делятся и другие процессы того же ключа."""
+        self._refill()
+        self.level = min(self.level, float(remaining))
+
+    def pause(self, seconds: float):
+        """Опустошает ведро так, чтобы следующий запрос прошёл не раньше чем через `seconds`."""
+        self._refill()
+        self.level = min(self.level, 1 - self.rate * seconds)
+
+
+class CircuitBreaker:
+    """Размыкается после `failure_threshold` неудач подряд и пропускает пробный запрос через `cooldown` секунд."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 30):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.cooldown = float(cooldown)
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+    def before_request(self):
+        if self.state == self.OPEN:
+            left = self.cooldown - (time.monotonic() - self._opened_at)
+            if left > 0:
+                raise CircuitOpenError(f"OpenAI circuit breaker is open, retry in {left:.0f}s")
+            self.state = self.HALF_OPEN
+            self._trial_in_flight = False
+        if self.state == self.HALF_OPEN:
+            if self._trial_in_flight:
+                raise CircuitOpenError("OpenAI circuit breaker is half-open, waiting for a trial request")
+            self._trial_in_flight = True
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self._trial_in_flight = False
+
+    def release_trial(self):
+        """Освобождает пробный запрос, завершившийся без вердикта (отмена): следующий станет пробным."""
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                print(f"OpenAI circuit breaker opened after {self.failures} failures")
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+
+
+def _is_retryable(error: Exception) -> bool:
+    import openai
+    if isinstance(error, (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+def _retry_after(error: Exception) -> float | None:
+    """Задержка, которую просит сервер (retry-after-ms / retry-after)."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    ms = response.headers.get("retry-after-ms")
+    if ms:
+        try:
+            return float(ms) / 1000
+        except ValueError:
+            pass
+    return parse_duration(response.headers.get("retry-after"))
+
+
+class OpenAIGovernor:
+    """Один на процесс: ограничивает темп запросов к OpenAI и повторяет неудачные."""
+
+    def __init__(self, rpm: float = 500, tpm: float = 30000, burst_seconds: float = 10, max_retries: int = 5,
+                 backoff_base: float = 1.0, backoff_max: float = 30.0, failure_threshold: int = 5,
+                 cooldown: float = 30.0):
+        self.requests = TokenBucket(rpm, burst_seconds)
+        self.tokens = TokenBucket(tpm, burst_seconds)
+        self.max_retries = max(0, int(max_retries))
+        self.backoff_base = float(backoff_base)
+        self.backoff_max = float(backoff_max)
+        self.breaker = CircuitBreaker(failure_threshold, cooldown)
+        self.counters = {"requests": 0, "retries": 0, "rate_limited": 0, "failures": 0, "rejected": 0, "waited_seconds": 0.0}
+        self._lock: asyncio.Lock | None = None
+
+    async def _acquire(self, estimated_tokens: int):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        # Под локом ждём по очереди: запросы проходят в порядке поступления
+        async with self._lock:
+            while True:
+                wait = max(self.requests.wait_time(1), self.tokens.wait_time(estimated_tokens))
+                if wait <= 0:
+                    break
+                self.counters["waited_seconds"] += wait
+                await asyncio.sleep(wait)
+            self.requests.take(1)
+            self.tokens.take(estimated_tokens)
+
+    def _update_limits(self, headers):
+        limit_requests = _int_header(headers, _LIMIT_REQUESTS)
+        limit_tokens = _int_header(headers, _LIMIT_TOKENS)
+        if limit_requests and limit_requests != self.requests.per_minute:
+            self.requests.set_limit(limit_requests)
+        if limit_tokens and limit_tokens != self.tokens.per_minute:
+            self.tokens.set_limit(limit_tokens)
+        remaining_requests = _int_header(headers, _REMAINING_REQUESTS)
+        remaining_tokens = _int_header(headers, _REMAINING_TOKENS)
+        if remaining_requests is not None:
+            self.requests.sync_remaining(remaining_requests)
+        if remaining_tokens is not None:
+            self.tokens.sync_remaining(remaining_tokens)
+
+    def settle_tokens(self, estimated_tokens: int, actual_tokens: int | None):
+        """Поправляет ведро TPM на разницу между оценкой и фактическим расходом из usage."""
+        if actual_tokens is not None:
+            self.tokens.take(actual_tokens - estimated_tokens)
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        # Full jitter: случайная задержка от 0 до экспоненциального потолка
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        return max(delay, _retry_after(error) or 0)
+
+    async def request(self, send, estimated_tokens: int):
+        """Выполняет `await send()` (запрос with_raw_response) с лимитами, повторами и предохранителем.
+
+        Возвращает сырой ответ OpenAI; исключения — GovernorError или ошибка API, которую повторять бессмысленно.
+        """
+        import openai
+
+        # Предохранитель проверяем один раз: повторы одного вызова — это одна попытка для него
+        try:
+            self.breaker.before_request()
+        except CircuitOpenError:
+            self.counters["rejected"] += 1
+            raise
+        try:
+            for attempt in range(self.max_retries + 1):
+                await self._acquire(estimated_tokens)
+                self.counters["requests"] += 1
+                try:
+                    raw = await send()
+                except Exception as e:
+                    if not _is_retryable(e):
+                        if isinstance(e, openai.AuthenticationError):
+                            # Неверный ключ не исправится сам — пусть предохранитель избавит API от лишних запросов
+                            self.breaker.record_failure()
+                        elif isinstance(e, openai.APIStatusError):
+                            # 400, 404 и т.п.: ошибка в самом запросе, а сервис доступен
+                            self.breaker.record_success()
+                        raise
+                    delay = self._backoff(attempt, e)
+                    if isinstance(e, openai.RateLimitError):
+                        self.counters["rate_limited"] += 1
+                        # Лимит исчерпан для всех запросов процесса, а не только для этого
+                        self.requests.pause(delay)
+                    if attempt == self.max_retries:
+                        self.counters["failures"] += 1
+                        self.breaker.record_failure()
+                        raise RetriesExhaustedError(f"OpenAI request failed after {attempt + 1} attempts: {e}") from e
+                    self.counters["retries"] += 1
+                    print(f"OpenAI request failed ({e.__class__.__name__}), retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+                    continue
+                self._update_limits(raw.headers)
+                self.breaker.record_success()
+                return raw
+        finally:
+            # Отмена (клиент SSE отключился, задачу остановили) или иная ошибка без вердикта:
+            # пробный запрос не должен навсегда заблокировать предохранитель
+            self.breaker.release_trial()
+
+    def stats(self) -> dict:
+        return {
+            "circuit": self.breaker.state,
+            "limits": {"requests_per_minute": self.requests.per_minute, "tokens_per_minute": self.tokens.per_minute},
+            "available": {"requests": round(self.requests.level, 1), "tokens": round(self.tokens.level)},
+            "counters": {**self.counters, "waited_seconds": round(self.counters["waited_seconds"], 2)},
+        }
+
+
+def get_openai_config() -> dict:
+    return get_config().get("openai") or {}
+
+
+_governor: OpenAIGovernor | None = None
+
+
+def get_governor() -> OpenAIGovernor:
+    """Регулятор из config.yaml (openai.*), создаётся при первом обращении."""
+    global _governor
+    if _governor is None:
+        cfg = get_openai_config()
+        _governor = OpenAIGovernor(
+            rpm=cfg.get("requests_per_minute", 500),
+            tpm=cfg.get("tokens_per_minute", 30000),
+            burst_seconds=cfg.get("burst_seconds", 10),
+            max_retries=cfg.get("max_retries", 5),
+            backoff_base=cfg.get("backoff_base", 1.0),
+            backoff_max=cfg.get("backoff_max", 30.0),
+            failure_threshold=cfg.get("circuit_failures", 5),
+            cooldown=cfg.get("circuit_cooldown", 30.0),
+        )
+    return _governor
+
+
+def estimate_tokens(messages: list[dict], max_output_ratio: float = 1.5) -> int:
+    """Грубая оценка расхода до ответа: ~4 символа на токен плюс ответ длиной с исходный текст."""
+    prompt = sum(len(m.get("content") or "") for m in messages) // 4 + 10
+    return int(prompt * (1 + max_output_ratio))
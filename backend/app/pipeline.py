@@ -0,0 +1,66 @@
+# pipeline.py — потоковый конвейер из асинхронных стадий
+# Источник и стадии связаны ограниченными очередями (asyncio.Queue(maxsize)):
+# если следующая стадия не успевает, предыдущая ждёт на put() — это и есть
+# обратное давление. Поэтому в памяти одновременно находится не больше
+# ~queue_size + concurrency элементов на стадию, независимо от длины потока.
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+# Маркер конца потока
+_DONE = object()
+
+
+class Stage:
+    """Стадия конвейера: `fn(item)` возвращает элемент для следующей стадии или None, чтобы его отбросить."""
+
+    def __init__(self, name: str, fn: Callable[[Any], Awaitable[Any]], concurrency: int = 1):
+        self.name = name
+        self.fn = fn
+        self.concurrency = max(1, int(concurrency))
+
+
+async def _feed(source: AsyncIterator, out: asyncio.Queue):
+    async for item in source:
+        await out.put(item)
+    await out.put(_DONE)
+
+
+async def _run_stage(stage: Stage, inbox: asyncio.Queue, out: asyncio.Queue | None):
+    remaining = stage.concurrency
+
+    async def worker():
+        nonlocal remaining
+        while True:
+            item = await inbox.get()
+            if item is _DONE:
+                # Возвращаем маркер соседям по стадии; последний передаёт его дальше
+                remaining -= 1
+                if remaining:
+                    await inbox.put(_DONE)
+                elif out is not None:
+                    await out.put(_DONE)
+                return
+            result = await stage.fn(item)
+            if result is not None and out is not None:
+                await out.put(result)
+
+    await asyncio.gather(*(worker() for _ in range(stage.concurrency)))
+
+
+async def run_stages(source: AsyncIterator, stages: list[Stage], queue_size: int = 8):
+    """Прогоняет элементы источника через стадии до конца потока.
+
+    Ошибка или отмена в любой стадии останавливает весь конвейер.
+    """
+    queues = [asyncio.Queue(maxsize=max(1, queue_size)) for _ in stages]
+    tasks = [asyncio.create_task(_feed(source, queues[0]))]
+    for i, stage in enumerate(stages):
+        out = queues[i + 1] if i + 1 < len(stages) else None
+        tasks.append(asyncio.create_task(_run_stage(stage, queues[i], out)))
+
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -1,8 +1,14 @@
 # state_manager.py
-# Этот модуль служит фасадом для управления состоянием пайплайна в Firestore.
+# Этот модуль служит фасадом для управления состоянием пайплайна в хранилище (Firestore или SQLite).
 
-from firebase_admin import firestore
-from app.firebase_manager import get_state_document, update_state, set_state
+from contextvars import ContextVar
+
+from app.firebase_manager import get_state_document, update_state, increment_state, set_state
+
+# Задача планировщика (app.jobs.Job), в контексте которой выполняется код пайплайна.
+# Если она задана, прогресс пишется в задачу в памяти, а не в общий документ состояния:
+# параллельные запуски не должны перетирать счётчики друг друга.
+current_job: ContextVar = ContextVar("current_job", default=None)
 
 DEFAULT_STATE = {
     "processed": 0,
@@ -20,15 +26,13 @@ def get_state():
 
 def reset_state():
     """Сбрасывает состояние прогресса в Firestore, но сохраняет last_id каналов."""
-    current_state = get_state()
-    new_state = {
-        **current_state, # Сохраняем существующие значения, включая 'channels'
+    # merge не трогает остальные поля (включая 'channels'), поэтому читать документ заранее не нужно
+    set_state({
         "processed": 0,
         "total": 0,
         "is_running": False,
         "finished": False,
-    }
-    set_state(new_state)
+    }, merge=True)
 
 def set_running(running: bool):
     """Устанавливает флаг, что процесс запущен или остановлен."""
@@ -42,17 +46,33 @@ def set_finished(finished: bool):
     update_state({"finished": finished})
 
 def increment_processed():
-    """Атомарно увеличивает счетчик обработанных постов в Firestore."""
-    update_state({"processed": firestore.Increment(1)})
+    """Атомарно увеличивает счетчик обработанных постов."""
+    job = current_job.get()
+    if job is not None:
+        job.processed += 1
+        return
+    increment_state("processed")
+
+def set_processed(processed: int):
+    """Устанавливает счетчик обработанных постов (когда их считает очередь воркеров)."""
+    job = current_job.get()
+    if job is not None:
+        job.processed = processed
+        return
+    update_state({"processed": processed})
 
 def set_total(total: int):
     """Устанавливает общее количество постов для обработки."""
+    job = current_job.get()
+    if job is not None:
+        job.total = total
+        return
     update_state({"total": total})
 
 def get_last_id(channel: str) -> int:
-    """Получает последний обработанный ID для указанного канала."""
-    state = get_state()
-    return state.get("channels", {}).get(channel, 0)
+    """Получает последний обработанный ID для указанного канала (из кэша документа состояния)."""
+    state = get_state_document()
+    return (state.get("channels") or {}).get(channel, 0)
 
 def set_last_id(channel: str, last_id: int):
     """Обновляет последний обработанный ID для канала."""
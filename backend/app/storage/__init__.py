@@ -0,0 +1,64 @@
+"""Pluggable persistence: Firestore (default) or a local SQLite database.
+
+The engine is chosen by `storage.backend` in config.yaml and can be overridden
+with the STORAGE_BACKEND / STORAGE_SQLITE_PATH environment variables.
+"""
+import os
+
+from app.config import BASE_DIR, get_config, load_env
+from app.storage.base import POSTS_COLLECTION, StorageBackend
+
+_storage: StorageBackend | None = None
+
+
+def _sqlite_path(sqlite_path: str | None) -> str:
+    path = sqlite_path or "data/pipeline.db"
+    if path != ":memory:" and not os.path.isabs(path):
+        path = os.path.join(BASE_DIR, path)
+    return path
+
+
+def _configured_backend() -> tuple[str, str | None]:
+    load_env()
+    cfg = get_config().get("storage") or {}
+    backend = os.getenv("STORAGE_BACKEND") or cfg.get("backend", "firestore")
+    sqlite_path = os.getenv("STORAGE_SQLITE_PATH") or cfg.get("sqlite_path")
+    return backend, sqlite_path
+
+
+def create_storage(backend: str, sqlite_path: str | None = None) -> StorageBackend:
+    """Builds a storage engine by name."""
+    if backend == "firestore":
+        from app.storage.firestore import FirestoreStorage
+        return FirestoreStorage()
+    if backend == "sqlite":
+        from app.storage.sqlite import SQLiteStorage
+        return SQLiteStorage(_sqlite_path(sqlite_path))
+    raise ValueError(f"Unknown storage backend: {backend!r}")
+
+
+def get_storage() -> StorageBackend:
+    """Returns the configured storage engine, creating it on first use."""
+    global _storage
+    if _storage is None:
+        _storage = create_storage(*_configured_backend())
+    return _storage
+
+
+def storage_key() -> str:
+    """Names the database the engine writes to ("firestore", "sqlite:<path>") without connecting to it."""
+    if _storage is not None:
+        return _storage.key
+    backend, sqlite_path = _configured_backend()
+    if backend == "sqlite":
+        return f"sqlite:{_sqlite_path(sqlite_path)}"
+    return backend
+
+
+def set_storage(storage: StorageBackend | None):
+    """Replaces the process-wide engine (None resets it to the configured one)."""
+    global _storage
+    _storage = storage
+
+
+__all__ = ["POSTS_COLLECTION", "StorageBackend", "create_storage", "get_storage", "set_storage", "storage_key"]
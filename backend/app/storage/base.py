@@ -0,0 +1,167 @@
+"""Storage interface shared by every persistence engine."""
+import copy
+from abc import ABC, abstractmethod
+
+POSTS_COLLECTION = "parsed_posts"
+POST_CHANGES_COLLECTION = "post_changes"
+
+# Operations recorded in the post change log
+INSERT = "insert"
+UPDATE = "update"
+DELETE = "delete"
+CLEAR = "clear"
+
+
+def apply_updates(doc: dict, updates: dict) -> dict:
+    """Applies Firestore-style updates (dotted keys address nested fields) to a plain dict."""
+    for key, value in updates.items():
+        target = doc
+        parts = key.split(".")
+        for part in parts[:-1]:
+            nested = target.get(part)
+            if not isinstance(nested, dict):
+                nested = {}
+                target[part] = nested
+            target = nested
+        target[parts[-1]] = value
+    return doc
+
+
+def deep_merge(target: dict, data: dict) -> dict:
+    """Applies a set(..., merge=True) to a plain dict: nested dicts merge, other values replace."""
+    for key, value in data.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            deep_merge(target[key], value)
+        else:
+            target[key] = copy.deepcopy(value)
+    return target
+
+
+class StorageBackend(ABC):
+    """A document store with a dedicated, indexed collection for posts.
+
+    Generic documents (pipeline state, saved channel, migrations) live in named
+    collections; posts have their own methods so engines can index them.
+    """
+
+    name = "base"
+
+    @property
+    def key(self) -> str:
+        """Identifies the database this engine writes to (see app.storage.storage_key)."""
+        return self.name
+
+    @abstractmethod
+    def server_timestamp(self):
+        """Returns the value to store as a "saved at" timestamp."""
+
+    # --- Generic documents ---
+
+    @abstractmethod
+    def get_document(self, collection: str, doc_id: str) -> dict | None:
+        """Returns a document as a dict, or None if it does not exist."""
+
+    @abstractmethod
+    def set_document(self, collection: str, doc_id: str, data: dict, merge: bool = False):
+        """Writes a document, overwriting it unless merge is True."""
+
+    @abstractmethod
+    def update_document(self, collection: str, doc_id: str, updates: dict):
+        """Updates fields of a document; dotted keys address nested fields."""
+
+    @abstractmethod
+    def increment_field(self, collection: str, doc_id: str, field: str, amount: int = 1):
+        """Atomically increments a numeric field."""
+
+    @abstractmethod
+    def add_document(self, collection: str, data: dict) -> str:
+        """Adds a document with a generated ID and returns the ID."""
+
+    @abstractmethod
+    def list_documents(self, collection: str, order_by: str | None = None,
+                       descending: bool = False, limit: int | None = None) -> list[dict]:
+        """Lists documents of a collection; each dict carries its 'id'."""
+
+    @abstractmethod
+    def delete_collection(self, collection: str) -> int:
+        """Deletes every document of a collection and returns how many were deleted."""
+
+    # --- Change notifications (optional) ---
+
+    def watch_document(self, collection: str, doc_id: str, callback):
+        """Calls callback(data or None) on every change of a document.
+
+        Returns a function that stops watching, or None if the engine cannot push
+        changes (readers then fall back to re-reading).
+        """
+        return None
+
+    def watch_documents(self, collection: str, callback, order_by: str | None = None,
+                        descending: bool = False, limit: int | None = None):
+        """Like watch_document for a list_documents query; callback receives the list."""
+        return None
+
+    # --- Posts ---
+
+    @abstractmethod
+    def add_post(self, post_data: dict) -> str:
+        """Saves a post and returns its generated ID."""
+
+    @abstractmethod
+    def list_posts(self) -> list[dict]:
+        """Returns all posts ordered by original_date, newest first; each carries its 'id'."""
+
+    @abstractmethod
+    def list_posts_page(self, limit: int, after: tuple | None = None, source_channel: str | None = None,
+                        date_from=None, date_to=None) -> list[dict]:
+        """Returns one page of posts ordered by (original_date, id), oldest first; each carries its 'id'.
+
+        `after` is the (original_date, id) of the last post of the previous page.
+        `date_from` is inclusive and `date_to` exclusive. Posts without
+        original_date are not exported.
+        """
+
+    @abstractmethod
+    def get_post(self, post_id: str) -> dict | None:
+        """Returns a single post, or None if it does not exist."""
+
+    @abstractmethod
+    def find_post_by_message(self, source_channel: str, message_id: int) -> dict | None:
+        """Returns the post saved for a Telegram message (with its 'id'), or None."""
+
+    @abstractmethod
+    def update_post(self, post_id: str, updates: dict):
+        """Updates fields of a post."""
+
+    @abstractmethod
+    def delete_post(self, post_id: str):
+        """Deletes a single post."""
+
+    @abstractmethod
+    def delete_all_posts(self) -> int:
+        """Deletes all posts and returns how many were deleted."""
+
+    # --- Post change log ---
+
+    @abstractmethod
+    def record_post_change(self, post_id: str | None, op: str) -> int:
+        """Appends a change (insert, update, delete or clear) and returns the new posts version.
+
+        Versions grow by one with every change, across all processes sharing the store.
+        """
+
+    @abstractmethod
+    def posts_version(self) -> int:
+        """Returns the current posts version (0 if nothing was ever recorded)."""
+
+    @abstractmethod
+    def list_post_changes(self, since: int, limit: int) -> list[dict]:
+        """Returns changes with version > since, oldest first: {'version', 'post_id', 'op'}."""
+
+    @abstractmethod
+    def post_changes_floor(self) -> int:
+        """Returns the version after which the log is complete (older entries may be pruned)."""
+
+    @abstractmethod
+    def prune_post_changes(self, keep: int):
+        """Deletes all but the newest `keep` changes."""
@@ -0,0 +1,111 @@
+"""In-process read-through cache for small, hot documents (pipeline state, saved channel).
+
+A cached value is served locally until it is `storage_cache.ttl` seconds old;
+writers made through the facade update or invalidate it right away. When the
+engine can push changes (Firestore snapshot listeners) and
+`storage_cache.listen` is on, the listener keeps the value fresh instead and
+the TTL no longer applies, so changes made by other processes show up too.
+"""
+import copy
+import threading
+import time
+
+from app.config import get_config
+from app.storage import get_storage
+
+_MISSING = object()
+
+
+def get_cache_config() -> dict:
+    return get_config().get("storage_cache") or {}
+
+
+class CachedDocument:
+    """Caches whatever `load(storage)` returns (a document, None, or a query result).
+
+    `watch(storage, callback)` optionally subscribes to changes and returns an
+    unsubscribe function (or None when the engine cannot push changes).
+    Callers always get a copy, so they may mutate it freely.
+    """
+
+    def __init__(self, name: str, load, watch=None):
+        self.name = name
+        self._load = load
+        self._watch = watch
+        self._lock = threading.RLock()
+        self._value = _MISSING
+        self._loaded_at = 0.0
+        self._storage = None
+        self._unsubscribe = None
+        self.hits = 0
+        self.misses = 0
+
+    def _bind(self, storage):
+        # The engine can be swapped (set_storage); a value read from another engine is useless
+        if storage is self._storage:
+            return
+        self._stop_watching()
+        self._storage = storage
+        self._value = _MISSING
+        cfg = get_cache_config()
+        if self._watch is not None and cfg.get("listen", True):
+            try:
+                self._unsubscribe = self._watch(storage, self._on_change)
+            except Exception as e:
+                print(f"Could not watch {self.name}, falling back to TTL: {e}")
+
+    def _stop_watching(self):
+        if self._unsubscribe is not None:
+            try:
+                self._unsubscribe()
+            except Exception as e:
+                print(f"Could not stop watching {self.name}: {e}")
+            self._unsubscribe = None
+
+    def _on_change(self, value):
+        with self._lock:
+            self._value = value
+            self._loaded_at = time.monotonic()
+
+    def _is_fresh(self) -> bool:
+        if self._value is _MISSING:
+            return False
+        if self._unsubscribe is not None:
+            return True
+        ttl = float(get_cache_config().get("ttl", 5))
+        return time.monotonic() - self._loaded_at < ttl
+
+    def get(self):
+        storage = get_storage()
+        with self._lock:
+            self._bind(storage)
+            if self._is_fresh():
+                self.hits += 1
+                return copy.deepcopy(self._value)
+            self.misses += 1
+            # Loading under the lock keeps concurrent misses down to a single read
+            value = self._load(storage)
+            self._value = value
+            self._loaded_at = time.monotonic()
+            return copy.deepcopy(value)
+
+    def put(self, value):
+        """Write-through: stores the value just written to the engine."""
+        with self._lock:
+            self._bind(get_storage())
+            self._value = copy.deepcopy(value)
+            self._loaded_at = time.monotonic()
+
+    def modify(self, change):
+        """Applies `change(value)` to a cached value in place; does nothing if nothing is cached."""
+        with self._lock:
+            self._bind(get_storage())
+            if self._value is not _MISSING and self._value is not None:
+                change(self._value)
+
+    def invalidate(self):
+        with self._lock:
+            self._value = _MISSING
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "listening": self._unsubscribe is not None}
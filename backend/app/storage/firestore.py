@@ -0,0 +1,228 @@
+"""Firestore storage engine (the default)."""
+import os
+
+from app.config import BASE_DIR
+from app.storage.base import POST_CHANGES_COLLECTION, POSTS_COLLECTION, StorageBackend
+
+# The posts version counter lives next to the rest of the pipeline state
+VERSION_COLLECTION = "pipeline_state"
+VERSION_DOC = "posts_version"
+
+
+def _firestore():
+    """Returns the firebase_admin.firestore module, importing it on first use."""
+    from firebase_admin import firestore
+    return firestore
+
+
+def initialize_firestore():
+    """Initializes the Firestore client, safely checking if it's already initialized."""
+    import firebase_admin
+    from firebase_admin import credentials
+    if not firebase_admin._apps:
+        cred_path = os.path.join(BASE_DIR, "firebase-credentials.json")
+        cred = credentials.Certificate(cred_path)
+        firebase_admin.initialize_app(cred)
+
+    return _firestore().client()
+
+
+class FirestoreStorage(StorageBackend):
+    name = "firestore"
+
+    def __init__(self):
+        # firebase_admin (и google-cloud-firestore под ним) подключается при первом запросе
+        self._db = None
+
+    @property
+    def db(self):
+        if self._db is None:
+            self._db = initialize_firestore()
+        return self._db
+
+    def server_timestamp(self):
+        return _firestore().SERVER_TIMESTAMP
+
+    # --- Generic documents ---
+
+    def get_document(self, collection, doc_id):
+        doc = self.db.collection(collection).document(doc_id).get()
+        if doc.exists:
+            return doc.to_dict()
+        return None
+
+    def set_document(self, collection, doc_id, data, merge=False):
+        self.db.collection(collection).document(doc_id).set(data, merge=merge)
+
+    def update_document(self, collection, doc_id, updates):
+        self.db.collection(collection).document(doc_id).update(updates)
+
+    def increment_field(self, collection, doc_id, field, amount=1):
+        self.update_document(collection, doc_id, {field: _firestore().Increment(amount)})
+
+    def add_document(self, collection, data):
+        _, ref = self.db.collection(collection).add(data)
+        return ref.id
+
+    def _documents_query(self, collection, order_by=None, descending=False, limit=None):
+        query = self.db.collection(collection)
+        if order_by:
+            direction = _firestore().Query.DESCENDING if descending else _firestore().Query.ASCENDING
+            query = query.order_by(order_by, direction=direction)
+        if limit:
+            query = query.limit(limit)
+        return query
+
+    @staticmethod
+    def _with_id(doc):
+        data = doc.to_dict()
+        data['id'] = doc.id
+        return data
+
+    def list_documents(self, collection, order_by=None, descending=False, limit=None):
+        query = self._documents_query(collection, order_by, descending, limit)
+        return [self._with_id(doc) for doc in query.get()]
+
+    def watch_document(self, collection, doc_id, callback):
+        def on_snapshot(snapshots, changes, read_time):
+            doc = snapshots[0] if snapshots else None
+            callback(doc.to_dict() if doc is not None and doc.exists else None)
+
+        watch = self.db.collection(collection).document(doc_id).on_snapshot(on_snapshot)
+        return watch.unsubscribe
+
+    def watch_documents(self, collection, callback, order_by=None, descending=False, limit=None):
+        def on_snapshot(snapshots, changes, read_time):
+            callback([self._with_id(doc) for doc in snapshots])
+
+        watch = self._documents_query(collection, order_by, descending, limit).on_snapshot(on_snapshot)
+        return watch.unsubscribe
+
+    def delete_collection(self, collection):
+        deleted_count = 0
+        for doc in self.db.collection(collection).stream():
+            doc.reference.delete()
+            deleted_count += 1
+        return deleted_count
+
+    # --- Posts ---
+
+    def add_post(self, post_data):
+        return self.add_document(POSTS_COLLECTION, post_data)
+
+    def list_posts(self):
+        posts_ref = self.db.collection(POSTS_COLLECTION).order_by(
+            "original_date", direction=_firestore().Query.DESCENDING)
+        posts = []
+        for doc in posts_ref.stream():
+            post_data = doc.to_dict()
+            post_data['id'] = doc.id # Добавляем ID документа
+            posts.append(post_data)
+        return posts
+
+    def list_posts_page(self, limit, after=None, source_channel=None, date_from=None, date_to=None):
+        from google.cloud.firestore_v1.base_query import FieldFilter
+        from google.cloud.firestore_v1.field_path import FieldPath
+
+        # Filtering by channel together with ordering by date needs a composite
+        # index (source_channel ASC, original_date ASC); Firestore prints a link to create it
+        query = self.db.collection(POSTS_COLLECTION)
+        if source_channel:
+            query = query.where(filter=FieldFilter("source_channel", "==", source_channel))
+        if date_from:
+            query = query.where(filter=FieldFilter("original_date", ">=", date_from))
+        if date_to:
+            query = query.where(filter=FieldFilter("original_date", "<", date_to))
+        query = query.order_by("original_date").order_by(FieldPath.document_id())
+        if after:
+            query = query.start_after({"original_date": after[0], FieldPath.document_id(): after[1]})
+        posts = []
+        for doc in query.limit(limit).stream():
+            post_data = doc.to_dict()
+            post_data['id'] = doc.id
+            posts.append(post_data)
+        return posts
+
+    def get_post(self, post_id):
+        return self.get_document(POSTS_COLLECTION, post_id)
+
+    def find_post_by_message(self, source_channel, message_id):
+        from google.cloud.firestore_v1.base_query import FieldFilter
+
+        # Запрос только на равенство — обходится без составного индекса
+        query = (self.db.collection(POSTS_COLLECTION)
+                 .where(filter=FieldFilter("source_channel", "==", source_channel))
+                 .where(filter=FieldFilter("original_message_id", "==", message_id))
+                 .limit(1))
+        for doc in query.get():
+            post_data = doc.to_dict()
+            post_data['id'] = doc.id
+            return post_data
+        return None
+
+    def update_post(self, post_id, updates):
+        self.update_document(POSTS_COLLECTION, post_id, updates)
+
+    def delete_post(self, post_id):
+        self.db.collection(POSTS_COLLECTION).document(post_id).delete()
+
+    def delete_all_posts(self):
+        return self.delete_collection(POSTS_COLLECTION)
+
+    # --- Post change log ---
+
+    def record_post_change(self, post_id, op):
+        firestore = _firestore()
+        version_ref = self.db.collection(VERSION_COLLECTION).document(VERSION_DOC)
+        changes = self.db.collection(POST_CHANGES_COLLECTION)
+
+        # The counter and the log entry are written in one transaction, so concurrent
+        # writers (server and workers) never hand out the same version twice
+        @firestore.transactional
+        def bump(transaction):
+            snapshot = version_ref.get(transaction=transaction)
+            version = ((snapshot.to_dict() or {}).get("version", 0) if snapshot.exists else 0) + 1
+            transaction.set(version_ref, {"version": version}, merge=True)
+            transaction.set(changes.document(f"{version:012d}"), {
+                "version": version,
+                "post_id": post_id,
+                "op": op,
+                "changed_at": firestore.SERVER_TIMESTAMP,
+            })
+            return version
+
+        return bump(self.db.transaction())
+
+    def posts_version(self):
+        return (self.get_document(VERSION_COLLECTION, VERSION_DOC) or {}).get("version", 0)
+
+    def list_post_changes(self, since, limit):
+        from google.cloud.firestore_v1.base_query import FieldFilter
+
+        query = (self.db.collection(POST_CHANGES_COLLECTION)
+                 .where(filter=FieldFilter("version", ">", since))
+                 .order_by("version")
+                 .limit(limit))
+        return [{"version": d.get("version"), "post_id": d.get("post_id"), "op": d.get("op")}
+                for d in (doc.to_dict() for doc in query.get())]
+
+    def post_changes_floor(self):
+        oldest = self.list_documents(POST_CHANGES_COLLECTION, order_by="version", limit=1)
+        return oldest[0]["version"] - 1 if oldest else self.posts_version()
+
+    def prune_post_changes(self, keep):
+        from google.cloud.firestore_v1.base_query import FieldFilter
+
+        cutoff = self.posts_version() - keep
+        query = self.db.collection(POST_CHANGES_COLLECTION).where(filter=FieldFilter("version", "<=", cutoff))
+        batch = self.db.batch()
+        pending = 0
+        for doc in query.stream():
+            batch.delete(doc.reference)
+            pending += 1
+            if pending == 500:  # Firestore batch limit
+                batch.commit()
+                batch = self.db.batch()
+                pending = 0
+        if pending:
+            batch.commit()
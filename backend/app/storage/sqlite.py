@@ -0,0 +1,295 @@
+"""Local SQLite storage engine for single-node deployments, development and offline benchmarks."""
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from app.storage.base import POSTS_COLLECTION, StorageBackend, apply_updates, deep_merge
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    collection TEXT NOT NULL,
+    id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (collection, id)
+);
+CREATE TABLE IF NOT EXISTS posts (
+    id TEXT PRIMARY KEY,
+    source_channel TEXT,
+    original_message_id INTEGER,
+    original_date TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_posts_source_channel ON posts (source_channel);
+CREATE INDEX IF NOT EXISTS idx_posts_original_date ON posts (original_date);
+CREATE INDEX IF NOT EXISTS idx_posts_original_message_id ON posts (original_message_id);
+CREATE TABLE IF NOT EXISTS post_changes (
+    version INTEGER PRIMARY KEY AUTOINCREMENT,
+    post_id TEXT,
+    op TEXT NOT NULL,
+    changed_at TEXT NOT NULL
+);
+"""
+
+
+def _new_id() -> str:
+    # Формат как у авто-ID Firestore: 20 символов
+    return uuid.uuid4().hex[:20]
+
+
+def _utc(dt: datetime) -> datetime:
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def _encode_default(value):
+    if isinstance(value, datetime):
+        return {"$date": _utc(value).isoformat()}
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _decode_hook(obj: dict):
+    if len(obj) == 1 and "$date" in obj:
+        return datetime.fromisoformat(obj["$date"])
+    return obj
+
+
+def dumps(data: dict) -> str:
+    return json.dumps(data, ensure_ascii=False, default=_encode_default)
+
+
+def loads(raw: str) -> dict:
+    return json.loads(raw, object_hook=_decode_hook)
+
+
+def _sort_key(value) -> str | None:
+    """Normalizes an orderable value (dates first of all) to a string that sorts correctly."""
+    if isinstance(value, datetime):
+        return _utc(value).isoformat()
+    if value is None:
+        return None
+    return str(value)
+
+
+class SQLiteStorage(StorageBackend):
+    name = "sqlite"
+
+    @property
+    def key(self) -> str:
+        return f"sqlite:{self.path}"
+
+    def __init__(self, path: str):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        # Одно соединение на процесс; FastAPI зовёт нас из пула потоков, поэтому под локом
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.RLock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+
+    def server_timestamp(self):
+        return datetime.now(timezone.utc)
+
+    def _query(self, sql: str, params=()) -> list:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    @contextmanager
+    def _read_modify_write(self):
+        """Holds the database write lock from the read to the write.
+
+        The thread lock only covers this process; workers and scripts open the
+        same file, so BEGIN IMMEDIATE keeps them from interleaving an update.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    # --- Generic documents ---
+
+    def get_document(self, collection, doc_id):
+        rows = self._query("SELECT data FROM documents WHERE collection = ? AND id = ?", (collection, doc_id))
+        return loads(rows[0][0]) if rows else None
+
+    def _write_document(self, collection, doc_id, data):
+        self._conn.execute(
+            "INSERT INTO documents (collection, id, data) VALUES (?, ?, ?) "
+            "ON CONFLICT (collection, id) DO UPDATE SET data = excluded.data",
+            (collection, doc_id, dumps(data)),
+        )
+
+    def set_document(self, collection, doc_id, data, merge=False):
+        if not merge:
+            with self._lock:
+                self._write_document(collection, doc_id, data)
+            return
+        with self._read_modify_write():
+            current = self.get_document(collection, doc_id) or {}
+            self._write_document(collection, doc_id, deep_merge(current, data))
+
+    def update_document(self, collection, doc_id, updates):
+        with self._read_modify_write():
+            current = self.get_document(collection, doc_id) or {}
+            self._write_document(collection, doc_id, apply_updates(current, updates))
+
+    def increment_field(self, collection, doc_id, field, amount=1):
+        with self._read_modify_write():
+            current = self.get_document(collection, doc_id) or {}
+            value = (current.get(field) or 0) + amount
+            self._write_document(collection, doc_id, {**current, field: value})
+
+    def add_document(self, collection, data):
+        doc_id = _new_id()
+        with self._lock:
+            self._write_document(collection, doc_id, data)
+        return doc_id
+
+    def list_documents(self, collection, order_by=None, descending=False, limit=None):
+        docs = []
+        for doc_id, raw in self._query("SELECT id, data FROM documents WHERE collection = ?", (collection,)):
+            data = loads(raw)
+            data['id'] = doc_id
+            docs.append(data)
+        if order_by:
+            # Как в Firestore: документы без поля сортировки в выборку не попадают
+            docs = [d for d in docs if d.get(order_by) is not None]
+            docs.sort(key=lambda d: _sort_key(d[order_by]), reverse=descending)
+        if limit:
+            docs = docs[:limit]
+        return docs
+
+    def delete_collection(self, collection):
+        if collection == POSTS_COLLECTION:
+            return self.delete_all_posts()
+        with self._lock:
+            return self._conn.execute("DELETE FROM documents WHERE collection = ?", (collection,)).rowcount
+
+    # --- Posts ---
+
+    def _write_post(self, post_id, post_data):
+        self._conn.execute(
+            "INSERT INTO posts (id, source_channel, original_message_id, original_date, data) "
+            "VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (id) DO UPDATE SET source_channel = excluded.source_channel, "
+            "original_message_id = excluded.original_message_id, "
+            "original_date = excluded.original_date, data = excluded.data",
+            (
+                post_id,
+                post_data.get("source_channel"),
+                post_data.get("original_message_id"),
+                _sort_key(post_data.get("original_date")),
+                dumps(post_data),
+            ),
+        )
+
+    def add_post(self, post_data):
+        post_id = _new_id()
+        with self._lock:
+            self._write_post(post_id, post_data)
+        return post_id
+
+    def list_posts(self):
+        posts = []
+        for post_id, raw in self._query("SELECT id, data FROM posts ORDER BY original_date DESC"):
+            post_data = loads(raw)
+            post_data['id'] = post_id
+            posts.append(post_data)
+        return posts
+
+    def list_posts_page(self, limit, after=None, source_channel=None, date_from=None, date_to=None):
+        where, params = ["original_date IS NOT NULL"], []
+        if source_channel:
+            where.append("source_channel = ?")
+            params.append(source_channel)
+        if date_from:
+            where.append("original_date >= ?")
+            params.append(_sort_key(date_from))
+        if date_to:
+            where.append("original_date < ?")
+            params.append(_sort_key(date_to))
+        if after:
+            after_date, after_id = _sort_key(after[0]), after[1]
+            where.append("(original_date > ? OR (original_date = ? AND id > ?))")
+            params += [after_date, after_date, after_id]
+        rows = self._query(
+            f"SELECT id, data FROM posts WHERE {' AND '.join(where)} ORDER BY original_date, id LIMIT ?",
+            (*params, limit),
+        )
+        posts = []
+        for post_id, raw in rows:
+            post_data = loads(raw)
+            post_data['id'] = post_id
+            posts.append(post_data)
+        return posts
+
+    def get_post(self, post_id):
+        rows = self._query("SELECT data FROM posts WHERE id = ?", (post_id,))
+        return loads(rows[0][0]) if rows else None
+
+    def find_post_by_message(self, source_channel, message_id):
+        rows = self._query(
+            "SELECT id, data FROM posts WHERE original_message_id = ? AND source_channel = ? LIMIT 1",
+            (message_id, source_channel),
+        )
+        if not rows:
+            return None
+        post_data = loads(rows[0][1])
+        post_data['id'] = rows[0][0]
+        return post_data
+
+    def update_post(self, post_id, updates):
+        with self._read_modify_write():
+            current = self.get_post(post_id)
+            if current is None:
+                raise KeyError(f"Post {post_id} not found")
+            self._write_post(post_id, apply_updates(current, updates))
+
+    def delete_post(self, post_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM posts WHERE id = ?", (post_id,))
+
+    def delete_all_posts(self):
+        with self._lock:
+            return self._conn.execute("DELETE FROM posts").rowcount
+
+    # --- Post change log ---
+
+    def record_post_change(self, post_id, op):
+        # AUTOINCREMENT never reuses a version, even after pruning
+        with self._lock:
+            return self._conn.execute(
+                "INSERT INTO post_changes (post_id, op, changed_at) VALUES (?, ?, ?)",
+                (post_id, op, datetime.now(timezone.utc).isoformat()),
+            ).lastrowid
+
+    def posts_version(self):
+        rows = self._query("SELECT seq FROM sqlite_sequence WHERE name = 'post_changes'")
+        return rows[0][0] if rows else 0
+
+    def list_post_changes(self, since, limit):
+        rows = self._query(
+            "SELECT version, post_id, op FROM post_changes WHERE version > ? ORDER BY version LIMIT ?",
+            (since, limit),
+        )
+        return [{"version": version, "post_id": post_id, "op": op} for version, post_id, op in rows]
+
+    def post_changes_floor(self):
+        with self._lock:
+            oldest = self._query("SELECT MIN(version) FROM post_changes")[0][0]
+            return oldest - 1 if oldest is not None else self.posts_version()
+
+    def prune_post_changes(self, keep):
+        with self._lock:
+            self._conn.execute("DELETE FROM post_changes WHERE version <= ?", (self.posts_version() - keep,))
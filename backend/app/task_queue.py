@@ -0,0 +1,229 @@
+# task_queue.py — долговечная очередь задач обработки сообщений
+# Веб-приложение кладёт сюда задачи, воркеры (python -m app.worker) забирают их
+# по одной с «арендой» (lease): если воркер упал, задача вернётся в очередь по
+# истечении аренды. Локально хватает SQLite; брокер подключается новым подклассом
+# TaskQueue и веткой в create_task_queue().
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from app.config import BASE_DIR, get_config
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class TaskQueue(ABC):
+    """Интерфейс очереди: любая реализация (SQLite, брокер) даёт те же операции."""
+
+    @abstractmethod
+    def enqueue_many(self, batch_id: str, kind: str, payloads: list[dict]) -> int:
+        """Кладёт задачи одного пакета (batch) и возвращает их количество."""
+
+    def enqueue(self, batch_id: str, kind: str, payload: dict) -> int:
+        return self.enqueue_many(batch_id, kind, [payload])
+
+    @abstractmethod
+    def claim(self, worker_id: str, lease_seconds: float) -> dict | None:
+        """Забирает следующую задачу в аренду; None — очередь пуста."""
+
+    @abstractmethod
+    def extend_lease(self, task_id: int, lease_seconds: float):
+        """Продлевает аренду задачи, которая ещё выполняется."""
+
+    @abstractmethod
+    def complete(self, task_id: int):
+        """Отмечает задачу выполненной."""
+
+    @abstractmethod
+    def fail(self, task_id: int, error: str, retry_delay: float = 0):
+        """Возвращает задачу в очередь или, если попытки кончились, помечает как failed."""
+
+    @abstractmethod
+    def cancel_batch(self, batch_id: str) -> int:
+        """Отменяет ещё не начатые задачи пакета и возвращает их количество."""
+
+    @abstractmethod
+    def batch_counts(self, batch_id: str) -> dict:
+        """Количество задач пакета по статусам."""
+
+    @abstractmethod
+    def stats(self) -> dict:
+        """Количество задач во всей очереди по статусам."""
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    batch_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL,
+    lease_until REAL,
+    worker_id TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_status_available ON tasks (status, available_at);
+CREATE INDEX IF NOT EXISTS idx_tasks_batch ON tasks (batch_id, status);
+"""
+
+
+class SQLiteTaskQueue(TaskQueue):
+    """Очередь в файле SQLite; безопасна для нескольких процессов на одном хосте."""
+
+    def __init__(self, path: str, max_attempts: int = 3):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.max_attempts = max(1, int(max_attempts))
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._lock = threading.RLock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+
+    def _transaction(self, fn):
+        # BEGIN IMMEDIATE сразу берёт блокировку на запись: два процесса не заберут одну задачу
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def enqueue_many(self, batch_id, kind, payloads):
+        now = time.time()
+        rows = [(batch_id, kind, json.dumps(p, ensure_ascii=False), now, now, now) for p in payloads]
+
+        def insert(conn):
+            conn.executemany(
+                "INSERT INTO tasks (batch_id, kind, payload, available_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            return len(rows)
+        return self._transaction(insert)
+
+    def claim(self, worker_id, lease_seconds):
+        def take(conn):
+            now = time.time()
+            # Задачи, чей воркер умер на последней попытке, больше не раздаём
+            conn.execute(
+                "UPDATE tasks SET status = ?, error = 'lease expired', lease_until = NULL, updated_at = ? "
+                "WHERE status = ? AND lease_until < ? AND attempts >= ?",
+                (FAILED, now, RUNNING, now, self.max_attempts),
+            )
+            # Просроченная аренда означает, что воркер умер: задачу можно забрать снова
+            row = conn.execute(
+                "SELECT id, batch_id, kind, payload, attempts FROM tasks "
+                "WHERE (status = ? AND available_at <= ?) OR (status = ? AND lease_until < ?) "
+                "ORDER BY id LIMIT 1",
+                (QUEUED, now, RUNNING, now),
+            ).fetchone()
+            if row is None:
+                return None
+            task_id, batch_id, kind, payload, attempts = row
+            conn.execute(
+                "UPDATE tasks SET status = ?, attempts = ?, lease_until = ?, worker_id = ?, updated_at = ? "
+                "WHERE id = ?",
+                (RUNNING, attempts + 1, now + lease_seconds, worker_id, now, task_id),
+            )
+            return {
+                "id": task_id,
+                "batch_id": batch_id,
+                "kind": kind,
+                "payload": json.loads(payload),
+                "attempts": attempts + 1,
+            }
+        return self._transaction(take)
+
+    def extend_lease(self, task_id, lease_seconds):
+        now = time.time()
+        self._transaction(lambda conn: conn.execute(
+            "UPDATE tasks SET lease_until = ?, updated_at = ? WHERE id = ? AND status = ?",
+            (now + lease_seconds, now, task_id, RUNNING),
+        ))
+
+    def complete(self, task_id):
+        self._transaction(lambda conn: conn.execute(
+            "UPDATE tasks SET status = ?, lease_until = NULL, error = NULL, updated_at = ? WHERE id = ?",
+            (DONE, time.time(), task_id),
+        ))
+
+    def fail(self, task_id, error, retry_delay=0):
+        def update(conn):
+            now = time.time()
+            row = conn.execute("SELECT attempts, status FROM tasks WHERE id = ?", (task_id,)).fetchone()
+            if row is None or row[1] == CANCELLED:
+                return
+            status = FAILED if row[0] >= self.max_attempts else QUEUED
+            conn.execute(
+                "UPDATE tasks SET status = ?, error = ?, lease_until = NULL, available_at = ?, updated_at = ? "
+                "WHERE id = ?",
+                (status, error, now + retry_delay, now, task_id),
+            )
+        self._transaction(update)
+
+    def cancel_batch(self, batch_id):
+        return self._transaction(lambda conn: conn.execute(
+            "UPDATE tasks SET status = ?, updated_at = ? WHERE batch_id = ? AND status = ?",
+            (CANCELLED, time.time(), batch_id, QUEUED),
+        ).rowcount)
+
+    def _counts(self, where: str = "", params=()) -> dict:
+        counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0, CANCELLED: 0}
+        with self._lock:
+            rows = self._conn.execute(f"SELECT status, COUNT(*) FROM tasks {where} GROUP BY status", params).fetchall()
+        for status, count in rows:
+            counts[status] = count
+        return counts
+
+    def batch_counts(self, batch_id):
+        return self._counts("WHERE batch_id = ?", (batch_id,))
+
+    def stats(self):
+        return self._counts()
+
+
+def create_task_queue(backend: str = "sqlite", path: str | None = None, max_attempts: int = 3) -> TaskQueue:
+    """Создаёт очередь по имени бэкенда."""
+    if backend == "sqlite":
+        path = path or "data/queue.db"
+        if path != ":memory:" and not os.path.isabs(path):
+            path = os.path.join(BASE_DIR, path)
+        return SQLiteTaskQueue(path, max_attempts=max_attempts)
+    raise ValueError(f"Unknown queue backend: {backend!r}")
+
+
+_queue: TaskQueue | None = None
+
+
+def get_queue_config() -> dict:
+    return get_config().get("queue") or {}
+
+
+def get_task_queue() -> TaskQueue:
+    """Возвращает очередь из config.yaml (queue.*), создавая её при первом обращении."""
+    global _queue
+    if _queue is None:
+        cfg = get_queue_config()
+        _queue = create_task_queue(
+            backend=os.getenv("QUEUE_BACKEND") or cfg.get("backend", "sqlite"),
+            path=os.getenv("QUEUE_PATH") or cfg.get("path"),
+            max_attempts=cfg.get("max_attempts", 3),
+        )
+    return _queue
@@ -0,0 +1,60 @@
+# tg_client.py — общий на процесс клиент Telethon
+# Несколько задач (параллельные запуски, диагностика) работают через одно соединение:
+# два TelegramClient на одном session-файле конфликтуют за SQLite-базу сессии.
+import asyncio
+import os
+from typing import TYPE_CHECKING
+
+from app.config import BASE_DIR, load_env
+
+if TYPE_CHECKING:
+    from telethon import TelegramClient
+
+_client: "TelegramClient | None" = None
+_lock = asyncio.Lock()
+_session_name = "session"
+
+
+def use_session(name: str):
+    """Выбирает session-файл клиента этого процесса (backend/<name>.session).
+
+    Процессы-воркеры работают каждый со своей авторизацией: один ключ авторизации,
+    подключённый из нескольких процессов сразу, Telegram отзывает (AUTH_KEY_DUPLICATED).
+    """
+    global _session_name
+    _session_name = name
+
+
+def session_path() -> str:
+    return os.path.join(BASE_DIR, _session_name)
+
+
+def has_session() -> bool:
+    """Есть ли session-файл (т.е. выполнялся ли вход для этого имени)."""
+    return os.path.exists(session_path() + ".session")
+
+
+async def get_client() -> "TelegramClient":
+    """Возвращает подключённый общий клиент, создавая и запуская его при первом вызове."""
+    global _client
+    async with _lock:
+        if _client is None:
+            from telethon import TelegramClient
+
+            load_env()
+            # Путь к session файлу в backend/
+            _client = TelegramClient(session_path(), int(os.getenv("TELEGRAM_API_ID")), os.getenv("TELEGRAM_API_HASH"))
+        if not _client.is_connected():
+            await _client.start()
+            me = await _client.get_me()
+            print(f"Started session as {me.username or me.first_name}.")
+    return _client
+
+
+async def disconnect_client():
+    """Отключает общий клиент (при остановке сервера или в конце CLI-запуска)."""
+    global _client
+    async with _lock:
+        if _client is not None and _client.is_connected():
+            await _client.disconnect()
+        _client = None
@@ -1,13 +1,27 @@
-import os
-from openai import OpenAI
-from dotenv import load_dotenv
+from app.config import load_env
+from app.openai_governor import estimate_tokens, get_governor, get_openai_config
 
-# Загружаем переменные окружения, включая OPENAI_API_KEY
-load_dotenv()
+# Клиент OpenAI создаётся при первом переводе: сам пакет openai импортируется долго
+_async_client = None
 
-# Инициализируем клиент OpenAI
-# Ключ будет автоматически подхвачен из переменной окружения OPENAI_API_KEY
-client = OpenAI()
+MODEL = "gpt-4o"  # Или gpt-3.5-turbo для скорости
+SYSTEM_PROMPT = "You are a professional translator."
+
+def get_async_client():
+    """Returns the shared AsyncOpenAI client, creating it on first use.
+
+    The async client lets translations overlap with each other and with the
+    rest of the pipeline instead of blocking the event loop. Retries are done
+    by the request governor (app.openai_governor), so the SDK's own are off.
+    """
+    global _async_client
+    if _async_client is None:
+        from openai import AsyncOpenAI
+        # Загружаем переменные окружения, включая OPENAI_API_KEY
+        load_env()
+        # Ключ будет автоматически подхвачен из переменной окружения OPENAI_API_KEY
+        _async_client = AsyncOpenAI(max_retries=0, timeout=float(get_openai_config().get("timeout", 60)))
+    return _async_client
 
 DEFAULT_PROMPT_TEMPLATE = (
     "Translate the following text to {target_lang}. "
@@ -18,6 +32,15 @@ DEFAULT_PROMPT_TEMPLATE = (
     "{text}"
 )
 
+def build_messages(text: str, target_lang: str, custom_prompt_template: str | None = None) -> list[dict]:
+    """Builds the chat messages for a translation request."""
+    prompt_template = custom_prompt_template or DEFAULT_PROMPT_TEMPLATE
+    final_prompt = prompt_template.format(target_lang=target_lang, text=text)
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": final_prompt}
+    ]
+
 async def translate_text(
     text: str,
     target_lang: str,
@@ -33,26 +56,76 @@ async def translate_text(
                                Must contain {target_lang} and {text} placeholders.
 
     Returns:
-        The translated text, or the original text if an error occurs.
+        The translated text.
+
+    Raises:
+        GovernorError: rate limits, retries or the circuit breaker gave up.
+        openai.OpenAIError: a non-retryable API error (bad request, auth, ...).
+    Errors are no longer swallowed: returning the original text made failed
+    translations indistinguishable from real ones.
     """
     if not text or not text.strip():
         return ""
-        
-    prompt_template = custom_prompt_template or DEFAULT_PROMPT_TEMPLATE
-    final_prompt = prompt_template.format(target_lang=target_lang, text=text)
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o",  # Или gpt-3.5-turbo для скорости
-            messages=[
-                {"role": "system", "content": "You are a professional translator."},
-                {"role": "user", "content": final_prompt}
-            ],
+    client = get_async_client()
+    messages = build_messages(text, target_lang, custom_prompt_template)
+    estimated = estimate_tokens(messages)
+    governor = get_governor()
+    raw = await governor.request(
+        lambda: client.chat.completions.with_raw_response.create(
+            model=MODEL,
+            messages=messages,
             temperature=0.3, # Более низкая температура для более точного перевода
-        )
-        translated_text = response.choices[0].message.content.strip()
-        return translated_text
-    except Exception as e:
-        print(f"An error occurred during translation: {e}")
-        # В случае ошибки возвращаем оригинальный текст, чтобы не терять контент
-        return text
+        ),
+        estimated,
+    )
+    response = raw.parse()
+    governor.settle_tokens(estimated, response.usage.total_tokens if response.usage else None)
+    return (response.choices[0].message.content or "").strip()
+
+async def stream_translation(
+    text: str,
+    target_lang: str,
+    custom_prompt_template: str | None = None
+):
+    """
+    Streams a translation from the OpenAI API chunk by chunk as the model produces it.
+
+    Yields:
+        Pieces of the translated text; their concatenation is the full translation.
+
+    Opening the stream goes through the request governor (limits, retries,
+    circuit breaker); a stream that breaks after the first token is not
+    retried, the error is raised to the caller.
+    """
+    if not text or not text.strip():
+        return
+
+    client = get_async_client()
+    messages = build_messages(text, target_lang, custom_prompt_template)
+    estimated = estimate_tokens(messages)
+    governor = get_governor()
+    raw = await governor.request(
+        lambda: client.chat.completions.with_raw_response.create(
+            model=MODEL,
+            messages=messages,
+            temperature=0.3,
+            stream=True,
+            # Последний кусок потока несёт usage — по нему поправим учёт токенов
+            stream_options={"include_usage": True},
+        ),
+        estimated,
+    )
+    stream = raw.parse()
+    try:
+        async for chunk in stream:
+            if chunk.usage:
+                governor.settle_tokens(estimated, chunk.usage.total_tokens)
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+    finally:
+        # Клиент ушёл или случилась ошибка — закрываем соединение с OpenAI, чтобы не жечь токены
+        await stream.close()
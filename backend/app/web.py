@@ -1,23 +1,48 @@
 from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.encoders import jsonable_encoder
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 import asyncio
+import json
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Literal
 from pydantic import BaseModel
 
 # Импортируем вашу основную функцию и управление состоянием
-from app.main import main as run_pipeline_main
-from app.state_manager import get_state, set_running, reset_state, set_finished
-from app.firebase_manager import initialize_firestore, get_all_posts, get_post, update_post, delete_post, delete_all_posts, save_channel, get_saved_channel, is_channel_saved, delete_saved_channel, cleanup_old_channels_collection
-from app.translation import translate_text
-
-# Инициализируем Firestore при старте
-initialize_firestore()
-
-# Выполняем миграцию для очистки старых коллекций
-cleanup_old_channels_collection()
-
-app = FastAPI()
+from app.main import main as run_pipeline_main, is_queue_mode
+from app.state_manager import DEFAULT_STATE, current_job, get_state
+from app.firebase_manager import get_all_posts, get_cache_stats, get_post, get_post_changes, get_posts_version, get_storage, update_post, delete_post, delete_all_posts, save_channel, get_saved_channel, is_channel_saved, delete_saved_channel
+from app.translation import stream_translation, translate_text
+from app.openai_governor import GovernorError, get_governor
+from app.migrations import pending_migrations, run_pending_migrations
+from app.config import get_config
+from app.jobs import JobScheduler
+from app import checkpoints
+from app.checkpoints import RunCheckpoint
+from app.dedup import get_dedup_index
+from app.export import MEDIA_TYPES as EXPORT_MEDIA_TYPES, decode_cursor, iter_export
+from app.tg_client import get_client, disconnect_client
+from app.live import live_ingestor
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Одноразовые миграции выполняем в фоне, не задерживая старт сервера.
+    При остановке отменяем задачи планировщика и закрываем соединение с Telegram."""
+    if pending_migrations():
+        asyncio.get_running_loop().run_in_executor(None, run_pending_migrations)
+    jobs_cfg = get_config().get("jobs") or {}
+    scheduler.configure(max_concurrent=jobs_cfg.get("max_concurrent", 1), history=jobs_cfg.get("history", 50))
+    scheduler.start()
+    yield
+    await live_ingestor.stop()
+    await scheduler.stop()
+    await disconnect_client()
+
+# Firestore, Telethon, Pillow и OpenAI подключаются лениво — при первом обращении.
+app = FastAPI(lifespan=lifespan)
 
 # CORS для связи фронтенда (Vite/React/Next) с API
 app.add_middleware(
@@ -26,10 +51,23 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],  # браузерные клиенты могут отправить его обратно в If-None-Match
 )
+class StreamAwareGZipMiddleware(GZipMiddleware):
+    """GZip для всех ответов, кроме SSE (пути */stream).
+
+    Сжатие копит события в буфере и сводит на нет потоковую отдачу перевода;
+    старые версии Starlette (fastapi>=0.109) сами text/event-stream не пропускают.
+    """
 
-# Глобальная переменная для отслеживания задачи
-current_task: asyncio.Task = None
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].endswith("/stream"):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+# Сжатие ответов (в т.ч. потоковой выгрузки /posts/export) для клиентов с Accept-Encoding: gzip
+app.add_middleware(StreamAwareGZipMiddleware, minimum_size=1000)
 
 @app.get("/", response_class=HTMLResponse)
 async def read_root():
@@ -118,73 +156,199 @@ async def read_root():
 
 @app.get("/status")
 async def status_endpoint():
-    """Возвращает текущее состояние прогресса."""
-    return get_state()
-
-async def run_pipeline_task(limit: int, period_hours: int | None = None, channel_url: str | None = None, is_top_posts: bool = False):
-    """Обёртка для запуска задачи и управления состоянием."""
-    global current_task
-    set_running(True)
+    """Возвращает прогресс последней задачи (алиас для /jobs/{id} последнего запуска)."""
+    job = scheduler.latest()
+    if job is None:
+        # После перезапуска сервера отдаём последнее сохранённое состояние
+        return await asyncio.to_thread(get_state)
+    return {**DEFAULT_STATE, **job.to_state()}
+
+async def run_pipeline_task(limit: int, period_hours: int | None = None, channel_url: str | None = None, is_top_posts: bool = False, media_filter: str = "default", resume_from: str | None = None):
+    """Обёртка для запуска пайплайна внутри задачи планировщика.
+
+    Каждый запуск ведёт контрольную точку; `resume_from` — ID контрольной точки
+    прерванного запуска, который нужно продолжить.
+    """
+    job = current_job.get()
+    if resume_from:
+        checkpoint = await asyncio.to_thread(RunCheckpoint.load, resume_from)
+        if checkpoint is None:
+            raise RuntimeError(f"Checkpoint {resume_from} not found")
+        await asyncio.to_thread(checkpoint.set_status, checkpoints.RUNNING)
+        print(f"Resuming run {resume_from}")
+    else:
+        params = {"limit": limit, "period_hours": period_hours, "channel_url": channel_url, "is_top_posts": is_top_posts, "media_filter": media_filter}
+        checkpoint = await asyncio.to_thread(RunCheckpoint.create, job.id, params)
+    print(f"Starting pipeline with limit: {limit}, channel: {channel_url or 'from config'}, top_posts: {is_top_posts}, media_filter: {media_filter}")
     try:
-        print(f"Starting pipeline with limit: {limit}, channel: {channel_url or 'from config'}, top_posts: {is_top_posts}")
-        await run_pipeline_main(limit=limit, period_hours=period_hours, channel_url=channel_url, is_top_posts=is_top_posts)
-        print("Pipeline finished successfully.")
+        await run_pipeline_main(limit=limit, period_hours=period_hours, channel_url=channel_url, is_top_posts=is_top_posts, media_filter=media_filter, checkpoint=checkpoint)
     except asyncio.CancelledError:
-        print("Pipeline task was cancelled.")
+        await asyncio.to_thread(checkpoint.set_status, checkpoints.CANCELLED)
+        raise
+    except Exception:
+        await asyncio.to_thread(checkpoint.set_status, checkpoints.FAILED)
+        raise
+    # main() сам гасит отмену, поэтому смотрим на флаг задачи
+    if job.cancel_requested:
+        await asyncio.to_thread(checkpoint.set_status, checkpoints.CANCELLED)
+        return
+    await asyncio.to_thread(checkpoint.set_status, checkpoints.FINISHED)
+    print("Pipeline finished successfully.")
+
+# Лимиты из config.yaml -> jobs применяются в lifespan, а не при импорте модуля
+scheduler = JobScheduler(run_pipeline_task)
+
+class RunPayload(BaseModel):
+    limit: int = 100
+    period_hours: float | None = None
+    channel_url: str | None = None
+    is_top_posts: bool = False
+    # default — всё, кроме видео/GIF; photos — только фото (фильтр Telegram); text — только текст
+    media_filter: Literal["default", "photos", "text"] = "default"
+    # Продолжить последний незавершённый запуск с его параметрами (остальные поля игнорируются)
+    resume: bool = False
+
+def _job_params(payload: RunPayload) -> dict | None:
+    """Параметры задачи; для resume — параметры прерванного запуска или None, если продолжать нечего."""
+    if not payload.resume:
+        return payload.model_dump(exclude={"resume"})
+    checkpoint = RunCheckpoint.latest_resumable()
+    if checkpoint is None:
+        return None
+    return {**checkpoint.params, "resume_from": checkpoint.id}
+
+def _checkpoint_in_use(checkpoint_id: str) -> bool:
+    """Идёт ли запуск с этой контрольной точкой: исходный (ID точки = ID задачи) или его продолжение."""
+    return any(
+        job.is_active and (job.id == checkpoint_id or job.params.get("resume_from") == checkpoint_id)
+        for job in scheduler.list()
+    )
+
+# --- Планировщик задач ---
+
+@app.post("/jobs")
+async def submit_job_endpoint(payload: RunPayload):
+    """Ставит новый запуск пайплайна в очередь."""
+    params = await asyncio.to_thread(_job_params, payload)
+    if params is None:
+        return JSONResponse(status_code=404, content={"ok": False, "error": "No interrupted run to resume"})
+    if params.get("resume_from") and _checkpoint_in_use(params["resume_from"]):
+        return JSONResponse(status_code=409, content={"ok": False, "error": "The run is still in progress"})
+    job = scheduler.submit(params)
+    return {"ok": True, "job": job.to_dict()}
+
+@app.get("/jobs")
+async def list_jobs_endpoint():
+    """Возвращает задачи от новых к старым."""
+    return {"ok": True, "jobs": [job.to_dict() for job in scheduler.list()]}
+
+@app.get("/jobs/{job_id}")
+async def get_job_endpoint(job_id: str):
+    """Возвращает статус и прогресс задачи."""
+    job = scheduler.get(job_id)
+    if not job:
+        return JSONResponse(status_code=404, content={"ok": False, "error": "Job not found"})
+    return {"ok": True, "job": job.to_dict()}
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job_endpoint(job_id: str):
+    """Отменяет задачу в очереди или в работе."""
+    if not scheduler.cancel(job_id):
+        return JSONResponse(status_code=404, content={"ok": False, "error": "Job not found or already finished"})
+    return {"ok": True, "job": scheduler.get(job_id).to_dict()}
+
+@app.get("/queue/stats")
+async def queue_stats_endpoint():
+    """Количество задач в очереди воркеров по статусам (режим pipeline.execution: queue)."""
+    from app.task_queue import get_task_queue
+    try:
+        return {"ok": True, "execution": "queue" if is_queue_mode() else "inline", "tasks": await asyncio.to_thread(get_task_queue().stats)}
     except Exception as e:
-        print(f"An error occurred in pipeline: {e}")
-    finally:
-        set_running(False)
-        set_finished(True) # Устанавливаем флаг завершения
-        current_task = None
+        print(f"Queue stats endpoint error: {e}")
+        return JSONResponse(status_code=500, content={"ok": False, "error": str(e)})
+
+@app.get("/dedup/stats")
+async def dedup_stats_endpoint():
+    """Счётчики поиска почти-дубликатов: совпадения и сэкономленная работа."""
+    index = get_dedup_index()
+    if index is None:
+        return {"ok": True, "enabled": False}
+    try:
+        return {"ok": True, "enabled": True, **index.stats()}
+    except Exception as e:
+        print(f"Dedup stats endpoint error: {e}")
+        return JSONResponse(status_code=500, content={"ok": False, "error": str(e)})
+
+@app.get("/cache/stats")
+async def cache_stats_endpoint():
+    """Попадания и промахи кэша документа состояния и сохранённого канала."""
+    return {"ok": True, "caches": get_cache_stats()}
 
 @app.post("/run-pipeline")
-async def trigger_pipeline(request: Request):
-    """Запускает основную логику в фоновом режиме."""
-    global current_task
-    if current_task and not current_task.done():
-        return JSONResponse(status_code=409, content={"message": "Процесс уже запущен."})
-    
-    data = await request.json()
-    limit = data.get("limit", 100)
-    period_hours = data.get("period_hours")
-    channel_url = data.get("channel_url")
-    is_top_posts = data.get("is_top_posts", False)
-
-    # Сбрасываем состояние перед новым запуском
-    reset_state()
-    
-    task = asyncio.create_task(run_pipeline_task(
-        limit=limit, 
-        period_hours=period_hours,
-        channel_url=channel_url,
-        is_top_posts=is_top_posts
-    ))
-    current_task = task
-    
-    return {"message": f"Процесс парсинга запущен. Лимит: {limit} постов."}
+async def trigger_pipeline(payload: RunPayload):
+    """Запускает основную логику в фоновом режиме (ставит задачу в очередь планировщика)."""
+    params = await asyncio.to_thread(_job_params, payload)
+    if params is None:
+        return JSONResponse(status_code=404, content={"message": "Нет прерванного запуска для продолжения."})
+    if params.get("resume_from") and _checkpoint_in_use(params["resume_from"]):
+        return JSONResponse(status_code=409, content={"message": "Последний запуск ещё выполняется."})
+    job = scheduler.submit(params)
+    if params.get("resume_from"):
+        return {"message": f"Продолжаем прерванный запуск. Лимит: {params['limit']} постов.", "job_id": job.id, "resume_from": params["resume_from"]}
+    return {"message": f"Процесс парсинга запущен. Лимит: {payload.limit} постов.", "job_id": job.id}
 
 @app.post("/stop-pipeline")
 async def stop_pipeline_endpoint():
-    """Отменяет запущенную задачу."""
-    global current_task
-    if not current_task or current_task.done():
+    """Отменяет последнюю запущенную задачу."""
+    job = scheduler.latest()
+    if not job or not scheduler.cancel(job.id):
         return JSONResponse(status_code=404, content={"message": "Нет активных процессов для остановки."})
 
-    current_task.cancel()
-    return {"message": "Команда на остановку отправлена. Процесс завершится в ближайшее время."}
+    return {"message": "Команда на остановку отправлена. Процесс завершится в ближайшее время.", "job_id": job.id}
 
 # --- Совместимость с фронтендом: алиасы под ожидаемые пути ---
 @app.post("/run")
-async def run_alias(request: Request):
+async def run_alias(payload: RunPayload):
     # Делегируем в основной обработчик
-    return await trigger_pipeline(request)
+    return await trigger_pipeline(payload)
 
 @app.post("/stop")
 async def stop_alias():
     # Делегируем в основной обработчик
     return await stop_pipeline_endpoint()
 
+# --- Живой режим: новые сообщения каналов попадают в базу сразу после публикации ---
+
+class LivePayload(BaseModel):
+    channels: list[str] | None = None
+    media_filter: Literal["default", "photos", "text"] = "default"
+
+@app.post("/live/start")
+async def live_start_endpoint(payload: LivePayload):
+    """Подписывается на новые и отредактированные сообщения каналов (по умолчанию — из config.yaml)."""
+    channels = payload.channels or get_config().get("channels") or []
+    if not channels:
+        return JSONResponse(status_code=400, content={"ok": False, "error": "No channels to follow"})
+    try:
+        await live_ingestor.start(channels, media_filter=payload.media_filter)
+        return {"ok": True, "live": live_ingestor.status()}
+    except Exception as e:
+        print(f"Live start endpoint error: {e}")
+        return JSONResponse(status_code=500, content={"ok": False, "error": str(e)})
+
+@app.post("/live/stop")
+async def live_stop_endpoint():
+    """Отключает живой режим."""
+    if not live_ingestor.is_running:
+        return JSONResponse(status_code=404, content={"ok": False, "error": "Live mode is not running"})
+    await live_ingestor.stop()
+    return {"ok": True, "live": live_ingestor.status()}
+
+@app.get("/live/status")
+async def live_status_endpoint():
+    """Состояние живого режима и счётчики сообщений."""
+    return {"ok": True, "live": live_ingestor.status()}
+
 # --- Эндпоинт для перевода текста ---
 class TranslationPayload(BaseModel):
     text: str
@@ -201,26 +365,152 @@ async def translate_endpoint(payload: TranslationPayload):
             custom_prompt_template=payload.prompt
         )
         return {"ok": True, "translated_text": translated}
+    except GovernorError as e:
+        # Лимиты OpenAI или предохранитель: запрос можно повторить позже
+        print(f"Translation endpoint error: {e}")
+        return JSONResponse(status_code=503, content={"ok": False, "error": str(e)})
     except Exception as e:
         print(f"Translation endpoint error: {e}")
         return JSONResponse(status_code=500, content={"ok": False, "error": str(e)})
 
+@app.get("/openai/status")
+async def openai_status_endpoint():
+    """Состояние регулятора запросов к OpenAI: лимиты, доступный запас, предохранитель, счётчики."""
+    return {"ok": True, "governor": get_governor().stats()}
+
+# --- Потоковый перевод (Server-Sent Events) ---
+# События: token — очередной кусок перевода {"text"}, done — готовый перевод
+# {"translated_text"}, error — ошибка {"error"}. Перевод виден по мере генерации,
+# а не после завершения всего ответа модели.
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def _sse_response(events) -> StreamingResponse:
+    # X-Accel-Buffering: nginx не должен копить события в буфере
+    return StreamingResponse(events, media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+async def _stream_translation_events(text: str, target_lang: str, prompt: str | None = None, on_done=None):
+    parts = []
+    try:
+        async for delta in stream_translation(text, target_lang, prompt):
+            parts.append(delta)
+            yield _sse("token", {"text": delta})
+        translated = "".join(parts).strip()
+        if on_done is not None:
+            await on_done(translated)
+        yield _sse("done", {"translated_text": translated})
+    except Exception as e:
+        print(f"Streaming translation error: {e}")
+        yield _sse("error", {"error": str(e)})
+
+@app.post("/translate/stream")
+async def translate_stream_endpoint(payload: TranslationPayload):
+    """Переводит текст, отдавая перевод по мере генерации (SSE)."""
+    return _sse_response(_stream_translation_events(payload.text, payload.target_lang, payload.prompt))
+
 
 # --- Эндпоинты для управления сохраненными постами ---
 
-@app.get("/posts")
-async def list_posts_endpoint():
-    """Возвращает список всех сохраненных постов."""
+def _posts_etag(version: int) -> str:
+    return f'W/"posts-{get_storage().name}-{version}"'
+
+def _json_default(value):
+    # В постах из нестандартных типов почти всегда только даты; остальное — как у FastAPI
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return jsonable_encoder(value)
+
+def _render_posts(version: int | None) -> bytes:
+    """Читает посты и сразу сериализует ответ в потоке, не занимая цикл событий.
+
+    json.dumps с default в разы быстрее jsonable_encoder, который обходит каждый
+    пост на Python, а результат тот же.
+    """
     posts = get_all_posts()
-    return {"ok": True, "posts": posts}
+    content = {"ok": True, "posts": posts} if version is None else {"ok": True, "version": version, "posts": posts}
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_json_default).encode("utf-8")
+
+@app.get("/posts")
+async def list_posts_endpoint(request: Request):
+    """Возвращает список всех сохраненных постов.
+
+    Поддерживает условный GET: ETag строится по версии коллекции, и если она не
+    изменилась с прошлого запроса (If-None-Match), отдаём 304 без чтения постов.
+    """
+    try:
+        version = await asyncio.to_thread(get_posts_version)
+    except Exception as e:
+        print(f"Posts version error: {e}")
+        version = None
+    if version is None:
+        return Response(content=await asyncio.to_thread(_render_posts, None), media_type="application/json")
+
+    etag = _posts_etag(version)
+    if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers={"ETag": etag})
+    # Версию читаем до постов: если запись случится между ними, клиент получит её ещё раз в /posts/changes
+    body = await asyncio.to_thread(_render_posts, version)
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+@app.get("/posts/changes")
+async def posts_changes_endpoint(since: int):
+    """Изменения постов после версии `since`: новые и изменённые документы целиком, удалённые — только ID.
+
+    При reset=true клиент должен заново загрузить /posts (журнал изменений обрезан или все посты удалены).
+    """
+    try:
+        changes = await asyncio.to_thread(get_post_changes, since)
+        changed_ids = changes["inserted"] + changes["updated"]
+        # Все документы читаем одним заходом в поток, а не по переключению на каждый пост
+        fetched = await asyncio.to_thread(lambda: [(post_id, get_post(post_id)) for post_id in changed_ids])
+        posts = [{**post, "id": post_id} for post_id, post in fetched if post is not None]
+        return {"ok": True, **changes, "posts": posts}
+    except Exception as e:
+        print(f"Posts changes endpoint error: {e}")
+        return JSONResponse(status_code=500, content={"ok": False, "error": str(e)})
+
+@app.get("/posts/export")
+async def export_posts_endpoint(format: Literal["ndjson", "csv"] = "ndjson", channel: str | None = None,
+                                date_from: datetime | None = None, date_to: datetime | None = None,
+                                cursor: str | None = None, limit: int | None = None):
+    """Потоковая выгрузка постов (от старых к новым) в NDJSON или CSV.
+
+    Фильтры: channel, date_from (включительно), date_to (не включительно). Каждая
+    запись несёт свой cursor — продолжить оборванную выгрузку можно с ?cursor=...
+    Сжатие gzip включается заголовком Accept-Encoding.
+    """
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"ok": False, "error": str(e)})
+
+    async def body():
+        try:
+            async for chunk in iter_export(format, source_channel=channel, date_from=date_from,
+                                           date_to=date_to, after=after, limit=limit):
+                yield chunk
+        except Exception as e:
+            # Заголовки уже отправлены: обрываем поток, клиент продолжит с последнего cursor
+            print(f"Posts export error: {e}")
+            raise
+
+    filename = f"posts.{'csv' if format == 'csv' else 'ndjson'}"
+    return StreamingResponse(body(), media_type=EXPORT_MEDIA_TYPES[format],
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
 
 class ManualTranslationPayload(BaseModel):
     target_lang: str = "EN"
 
 @app.post("/posts/{post_id}/translate")
 async def translate_post_endpoint(post_id: str, payload: ManualTranslationPayload):
-    """Переводит конкретный сохраненный пост и обновляет его в Firestore."""
-    post = get_post(post_id)
+    """Переводит конкретный сохраненный пост и обновляет его в Firestore.
+
+    В режиме pipeline.execution: queue перевод выполняет воркер: ответ 202 приходит
+    сразу, а обновлённый пост появится в /posts/changes.
+    """
+    post = await asyncio.to_thread(get_post, post_id)
     if not post:
         return JSONResponse(status_code=404, content={"ok": False, "error": "Post not found"})
     
@@ -228,6 +518,12 @@ async def translate_post_endpoint(post_id: str, payload: ManualTranslationPayloa
     if not original_text:
         return JSONResponse(status_code=400, content={"ok": False, "error": "Post has no text to translate"})
 
+    if is_queue_mode():
+        from app.task_queue import get_task_queue
+        task = {"post_id": post_id, "target_lang": payload.target_lang}
+        await asyncio.to_thread(get_task_queue().enqueue, f"translate:{post_id}", "translate_post", task)
+        return JSONResponse(status_code=202, content={"ok": True, "queued": True, "message": "Post translation queued."})
+
     try:
         translated = await translate_text(
             text=original_text,
@@ -239,13 +535,37 @@ async def translate_post_endpoint(post_id: str, payload: ManualTranslationPayloa
             "translated_content": translated,
             "target_lang": payload.target_lang
         }
-        update_post(post_id, updates)
+        await asyncio.to_thread(update_post, post_id, updates)
         
         return {"ok": True, "message": "Post translated and updated successfully."}
+    except GovernorError as e:
+        print(f"Manual translation endpoint error: {e}")
+        return JSONResponse(status_code=503, content={"ok": False, "error": str(e)})
     except Exception as e:
         print(f"Manual translation endpoint error: {e}")
         return JSONResponse(status_code=500, content={"ok": False, "error": str(e)})
 
+@app.post("/posts/{post_id}/translate/stream")
+async def translate_post_stream_endpoint(post_id: str, payload: ManualTranslationPayload):
+    """Переводит сохранённый пост с отдачей перевода по мере генерации (SSE).
+
+    В хранилище перевод записывается один раз — когда модель закончила ответ;
+    если клиент отключился раньше, пост не меняется.
+    """
+    post = await asyncio.to_thread(get_post, post_id)
+    if not post:
+        return JSONResponse(status_code=404, content={"ok": False, "error": "Post not found"})
+    if not post.get("content"):
+        return JSONResponse(status_code=400, content={"ok": False, "error": "Post has no text to translate"})
+
+    async def persist(translated: str):
+        await asyncio.to_thread(update_post, post_id, {
+            "translated_content": translated,
+            "target_lang": payload.target_lang,
+        })
+
+    return _sse_response(_stream_translation_events(post["content"], payload.target_lang, on_done=persist))
+
 @app.delete("/posts/{post_id}")
 async def delete_post_endpoint(post_id: str):
     """Удаляет конкретный пост по ID."""
@@ -264,6 +584,10 @@ async def delete_all_posts_endpoint():
     """Удаляет все сохраненные посты."""
     try:
         deleted_count = delete_all_posts()
+        index = get_dedup_index()
+        if index is not None:
+            # Иначе удалённые посты блокировали бы повторную выгрузку как «дубликаты»
+            index.clear()
         return {"ok": True, "message": f"Successfully deleted {deleted_count} posts."}
     except Exception as e:
         print(f"Delete all posts endpoint error: {e}")
@@ -328,20 +652,11 @@ class EchoPayload(BaseModel):
 @app.post("/debug/send-text")
 async def debug_send_text(payload: EchoPayload):
     try:
-        from telethon import TelegramClient
-        from dotenv import load_dotenv
-        import os
-        load_dotenv()
-        api_id = int(os.getenv("TELEGRAM_API_ID"))
-        api_hash = os.getenv("TELEGRAM_API_HASH")
-        session_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "session")
-        client = TelegramClient(session_path, api_id, api_hash)
-        await client.start()
+        client = await get_client()
         await client.send_message("me", f"[debug] {payload.text}")
         # отправка в канал назначения (если нужно)
         # from app.main import TARGET
         # await client.send_message(TARGET, f"[debug] {payload.text}")
-        await client.disconnect()
         return {"ok": True, "message": "debug text sent"}
     except Exception as e:
         return JSONResponse(status_code=500, content={"ok": False, "error": str(e)})
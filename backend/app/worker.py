@@ -0,0 +1,199 @@
+# worker.py — отдельный процесс-обработчик задач из очереди (app.task_queue)
+#
+# Запуск из каталога backend/:
+#     python -m app.worker --login --processes 4  # один раз: вход в Telegram для каждого процесса
+#     python -m app.worker                        # один процесс, 4 задачи параллельно
+#     python -m app.worker --processes 4          # четыре процесса на хосте (по ядру)
+#
+# У каждого процесса своя авторизация Telegram (backend/worker-<N>.session): один ключ
+# авторизации, подключённый из нескольких процессов сразу, Telegram отзывает.
+#
+# Сервер (uvicorn) в режиме pipeline.execution: queue только ставит задачи и
+# показывает прогресс; скачивание, брендирование, сохранение и перевод делают воркеры.
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import signal
+import socket
+
+from app.config import get_config
+from app.task_queue import get_queue_config, get_task_queue
+
+
+async def handle_process_message(client, payload: dict):
+    """Скачивает сообщение (или весь альбом) из Telegram и прогоняет его через общий путь обработки."""
+    from app.main import process_message
+    from app.messages import album_primary
+
+    entity = await client.get_entity(payload["channel"])
+    # Сообщения альбома запрашиваются одним вызовом; задачи из старых версий несут только message_id
+    ids = payload.get("album_ids") or [payload["message_id"]]
+    album = [m for m in await client.get_messages(entity, ids=ids) if m is not None]
+    if not album:
+        print(f"Message {payload['message_id']} of {payload['channel']} not found, skipping")
+        return
+    await process_message(client, payload["channel"], album_primary(album),
+                          is_top_post=payload.get("is_top_post", False),
+                          metrics=payload.get("metrics"),
+                          album=album)
+
+
+async def handle_translate_post(client, payload: dict):
+    """Переводит сохранённый пост и записывает перевод (ставится из POST /posts/{id}/translate)."""
+    from app.firebase_manager import get_post, update_post
+    from app.translation import translate_text
+
+    post = await asyncio.to_thread(get_post, payload["post_id"])
+    if not post or not post.get("content"):
+        return
+    translated = await translate_text(text=post["content"], target_lang=payload["target_lang"])
+    await asyncio.to_thread(update_post, payload["post_id"], {"translated_content": translated, "target_lang": payload["target_lang"]})
+
+
+HANDLERS = {
+    "process_message": handle_process_message,
+    "translate_post": handle_translate_post,
+}
+
+
+class Worker:
+    """Забирает задачи из очереди и выполняет до `concurrency` штук одновременно."""
+
+    def __init__(self, concurrency: int = 4, index: int = 0):
+        cfg = get_queue_config()
+        self.concurrency = max(1, int(concurrency))
+        self.lease_seconds = float(cfg.get("lease_seconds", 300))
+        self.poll_interval = float(cfg.get("poll_interval", 1.0))
+        self.retry_delay = float(cfg.get("retry_delay", 10))
+        self.session = worker_session(index)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.queue = get_task_queue()
+        self._stopping = asyncio.Event()
+
+    def stop(self):
+        """Перестаём брать новые задачи; текущие дорабатываются."""
+        self._stopping.set()
+
+    async def run(self):
+        from app.tg_client import disconnect_client, get_client, has_session, use_session
+
+        use_session(self.session)
+        if not has_session():
+            # Интерактивный вход из дочернего процесса невозможен — он делается заранее
+            print(f"Worker {self.worker_id}: no Telegram session {self.session}, run python -m app.worker --login first")
+            return
+        client = await get_client()
+        print(f"Worker {self.worker_id} started with concurrency {self.concurrency}")
+        try:
+            await asyncio.gather(*(self._loop(client, n) for n in range(self.concurrency)))
+        finally:
+            await disconnect_client()
+            print(f"Worker {self.worker_id} stopped")
+
+    async def _loop(self, client, slot: int):
+        slot_id = f"{self.worker_id}/{slot}"
+        while not self._stopping.is_set():
+            task = await asyncio.to_thread(self.queue.claim, slot_id, self.lease_seconds)
+            if task is None:
+                # Небольшой джиттер, чтобы воркеры не опрашивали очередь синхронно
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), self.poll_interval * random.uniform(0.5, 1.5))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._execute(client, task)
+
+    async def _execute(self, client, task: dict):
+        handler = HANDLERS.get(task["kind"])
+        if handler is None:
+            await asyncio.to_thread(self.queue.fail, task["id"], f"unknown task kind {task['kind']!r}")
+            return
+
+        heartbeat = asyncio.create_task(self._heartbeat(task["id"]))
+        try:
+            await handler(client, task["payload"])
+        except Exception as e:
+            print(f"Task {task['id']} ({task['kind']}) failed on attempt {task['attempts']}: {e}")
+            await asyncio.to_thread(self.queue.fail, task["id"], str(e), self.retry_delay)
+        else:
+            await asyncio.to_thread(self.queue.complete, task["id"])
+        finally:
+            heartbeat.cancel()
+
+    async def _heartbeat(self, task_id: int):
+        # Продлеваем аренду, пока задача выполняется (долгое брендирование видео и т.п.)
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            await asyncio.to_thread(self.queue.extend_lease, task_id, self.lease_seconds)
+
+
+def worker_session(index: int) -> str:
+    return f"worker-{index}"
+
+
+async def _login(index: int):
+    from app.tg_client import disconnect_client, get_client, use_session
+
+    use_session(worker_session(index))
+    # Telethon спросит телефон и код, если сессии ещё нет
+    await get_client()
+    await disconnect_client()
+
+
+def login(processes: int):
+    """Отдельный вход в Telegram для каждого процесса-воркера этого хоста."""
+    for index in range(processes):
+        print(f"Telegram login for {worker_session(index)}")
+        asyncio.run(_login(index))
+
+
+def run_worker(concurrency: int, index: int = 0):
+    worker = Worker(concurrency=concurrency, index=index)
+
+    async def _main():
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, worker.stop)
+            except NotImplementedError:
+                pass
+        await worker.run()
+
+    asyncio.run(_main())
+
+
+def main():
+    worker_cfg = get_config().get("worker") or {}
+    parser = argparse.ArgumentParser(description="Обработчик задач пайплайна из очереди")
+    parser.add_argument("--concurrency", type=int, default=worker_cfg.get("concurrency", 4),
+                        help="сколько задач один процесс выполняет одновременно")
+    parser.add_argument("--processes", type=int, default=worker_cfg.get("processes", 1),
+                        help="сколько процессов-воркеров запустить на этом хосте")
+    parser.add_argument("--login", action="store_true",
+                        help="войти в Telegram для каждого из --processes процессов и выйти")
+    args = parser.parse_args()
+
+    if args.login:
+        login(max(1, args.processes))
+        return
+
+    if args.processes <= 1:
+        run_worker(args.concurrency)
+        return
+
+    procs = [multiprocessing.Process(target=run_worker, args=(args.concurrency, index)) for index in range(args.processes)]
+    for p in procs:
+        p.start()
+    try:
+        for p in procs:
+            p.join()
+    except KeyboardInterrupt:
+        # Дочерние процессы получили SIGINT сами и дорабатывают текущие задачи
+        for p in procs:
+            p.join()
+
+
+if __name__ == "__main__":
+    main()
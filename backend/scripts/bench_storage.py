@@ -0,0 +1,133 @@
+"""Офлайн-бенчмарк хранилища: задержки основных операций фасада firebase_manager.
+
+Запуск из каталога backend/ (по умолчанию — временная SQLite-база, без сети):
+
+    python scripts/bench_storage.py --posts 2000
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python scripts/bench_storage.py --backend firestore --posts 50
+
+Firestore — только эмулятор или отдельный пустой проект (флаг --throwaway-project):
+бенчмарк пишет в документ состояния и список сохранённых каналов. После прогона
+удаляются только созданные им посты, а состояние и каналы восстанавливаются.
+
+Печатает p50/p95/max в миллисекундах для каждой операции.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import firebase_manager, state_manager  # noqa: E402
+from app.firebase_manager import CHANNELS_COLLECTION, MAIN_DOC, STATE_COLLECTION  # noqa: E402
+from app.storage import create_storage, get_storage, set_storage  # noqa: E402
+
+
+def _timed(samples: dict, name: str, fn, *args):
+    t0 = time.perf_counter()
+    result = fn(*args)
+    samples.setdefault(name, []).append((time.perf_counter() - t0) * 1000)
+    return result
+
+
+def _percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _snapshot() -> tuple:
+    """Документы вне коллекции постов, которые бенчмарк перезаписывает."""
+    storage = get_storage()
+    return storage.get_document(STATE_COLLECTION, MAIN_DOC), storage.list_documents(CHANNELS_COLLECTION)
+
+
+def _restore(snapshot: tuple):
+    state, channels = snapshot
+    storage = get_storage()
+    storage.set_document(STATE_COLLECTION, MAIN_DOC, state or {})
+    storage.delete_collection(CHANNELS_COLLECTION)
+    for channel in channels:
+        channel = dict(channel)
+        storage.set_document(CHANNELS_COLLECTION, channel.pop("id"), channel)
+
+
+def run(posts: int) -> dict:
+    samples = {}
+    base_date = datetime.now(timezone.utc)
+    post_ids = []
+    snapshot = _snapshot()
+    try:
+        _run_operations(samples, posts, base_date, post_ids)
+    finally:
+        # Удаляем только свои посты: delete_all_posts стёр бы и чужие
+        for post_id in post_ids:
+            if post_id:
+                _timed(samples, "delete_post", firebase_manager.delete_post, post_id)
+        _restore(snapshot)
+    return samples
+
+
+def _run_operations(samples: dict, posts: int, base_date: datetime, post_ids: list):
+    state_manager.reset_state()
+    for i in range(posts):
+        post = {
+            "source_channel": f"bench_{i % 5}",
+            "original_message_id": i,
+            "original_ids": [i],
+            "original_date": base_date - timedelta(minutes=i),
+            "content": f"Benchmark post {i} " * 10,
+            "translated_content": None,
+            "target_lang": None,
+            "has_media": False,
+            "media_count": 0,
+            "is_merged": False,
+            "is_top_post": False,
+            "original_views": i,
+        }
+        post_ids.append(_timed(samples, "save_post", firebase_manager.save_post, post))
+        _timed(samples, "increment_processed", state_manager.increment_processed)
+
+    for post_id in post_ids[: min(len(post_ids), 500)]:
+        _timed(samples, "get_post", firebase_manager.get_post, post_id)
+        _timed(samples, "update_post", firebase_manager.update_post, post_id, {"translated_content": "x"})
+    for _ in range(20):
+        _timed(samples, "get_all_posts", firebase_manager.get_all_posts)
+    for _ in range(200):
+        _timed(samples, "get_state", state_manager.get_state)
+    firebase_manager.save_channel("bench_channel")
+    for _ in range(200):
+        _timed(samples, "is_channel_saved", firebase_manager.is_channel_saved, "bench_channel")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", default="sqlite", choices=["sqlite", "firestore"])
+    parser.add_argument("--posts", type=int, default=1000)
+    parser.add_argument("--sqlite-path", default=None, help="по умолчанию — временный файл")
+    parser.add_argument("--throwaway-project", action="store_true",
+                        help="разрешить Firestore без эмулятора: проект настроен только для тестов")
+    args = parser.parse_args()
+
+    if args.backend == "firestore" and not (os.getenv("FIRESTORE_EMULATOR_HOST") or args.throwaway_project):
+        print("Refusing to benchmark a real Firestore project: set FIRESTORE_EMULATOR_HOST "
+              "or pass --throwaway-project for a project without production data.", file=sys.stderr)
+        return 2
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sqlite_path = args.sqlite_path or os.path.join(tmp, "bench.db")
+        set_storage(create_storage(args.backend, sqlite_path))
+        samples = run(args.posts)
+
+    print(f"{'operation':<22}{'n':>7}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for name, values in samples.items():
+        print(f"{name:<22}{len(values):>7}{statistics.median(values):>10.3f}"
+              f"{_percentile(values, 95):>10.3f}{max(values):>10.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,409 @@
+"""Нагрузочный тест API: пропускная способность, задержки и блокировки цикла событий.
+
+Запуск из каталога backend/ (без сети и учётных данных; клиенту нужен httpx):
+
+    pip install -r requirements-dev.txt
+    python scripts/load_test.py --clients 20 --duration 10
+    python scripts/load_test.py --clients 50 --endpoints status,posts_etag --block-threshold 20
+
+Скрипт поднимает в отдельных процессах `app.web:app` (uvicorn) на временной
+SQLite-базе с `--posts` постами и заглушку OpenAI с задержкой ответа
+`--openai-latency`, затем `--clients` конкурентных клиентов `--duration` секунд
+гоняют выбранные эндпоинты. Печатает число запросов, ошибки, запросы в секунду и
+p50/p95/p99/max в миллисекундах для каждого эндпоинта.
+
+Внутри сервера засекается каждый шаг цикла событий; шаг дольше
+`--block-threshold` мс — это синхронная работа, которая держит цикл и
+задерживает все остальные запросы. Такие блокировки печатаются с эндпоинтом,
+который их вызвал; с `--fail-on-block` скрипт тогда завершается с кодом 1.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Заголовок, по которому сервер относит блокировку цикла к эндпоинту
+LABEL_HEADER = "x-load-endpoint"
+BLOCKS_PATH = "/__load_test/blocks"
+
+TARGET_LANG = "EN"
+TRANSLATE_TEXT = "Короткий пост для проверки перевода под нагрузкой: пара предложений текста."
+
+
+# --- Сценарии: имя -> (метод, путь, тело); post_id и version подставляются перед запуском ---
+
+def build_endpoints(post_ids: list, version: int) -> dict:
+    def post_path(suffix: str = ""):
+        return lambda: f"/posts/{random.choice(post_ids)}{suffix}"
+
+    return {
+        "status": ("GET", lambda: "/status", None),
+        "jobs": ("GET", lambda: "/jobs", None),
+        "posts": ("GET", lambda: "/posts", None),
+        # Дашборд, который уже получил список: сервер отвечает 304 без чтения постов
+        "posts_etag": ("GET", lambda: "/posts", None),
+        "posts_changes": ("GET", lambda: f"/posts/changes?since={max(0, version - 10)}", None),
+        "channel_check": ("GET", lambda: "/channels/load_test/check", None),
+        "translate": ("POST", lambda: "/translate", {"text": TRANSLATE_TEXT, "target_lang": TARGET_LANG}),
+        "translate_stream": ("POST", lambda: "/translate/stream", {"text": TRANSLATE_TEXT, "target_lang": TARGET_LANG}),
+        "post_translate": ("POST", post_path("/translate"), {"target_lang": TARGET_LANG}),
+    }
+
+
+DEFAULT_ENDPOINTS = "status,jobs,posts,posts_etag,posts_changes,channel_check,translate,translate_stream,post_translate"
+
+
+# --- Заглушка OpenAI (отдельный процесс) ---
+
+def serve_mock_openai(port: int, latency: float):
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse, StreamingResponse
+    import uvicorn
+
+    mock = FastAPI()
+    # Высокие лимиты, чтобы регулятор запросов (app.openai_governor) не притормаживал тест
+    headers = {
+        "x-ratelimit-limit-requests": "100000",
+        "x-ratelimit-remaining-requests": "100000",
+        "x-ratelimit-limit-tokens": "100000000",
+        "x-ratelimit-remaining-tokens": "100000000",
+    }
+
+    @mock.post("/v1/chat/completions")
+    async def completions(request: Request):
+        body = await request.json()
+        words = ("Translated: " + body["messages"][-1]["content"][-200:]).split(" ")
+        usage = {"prompt_tokens": 50, "completion_tokens": len(words), "total_tokens": 50 + len(words)}
+        if not body.get("stream"):
+            await asyncio.sleep(latency)
+            return JSONResponse(headers=headers, content={
+                "id": "load-test", "object": "chat.completion", "created": 0, "model": body["model"],
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(words)}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+
+        async def chunks():
+            for i, word in enumerate(words):
+                await asyncio.sleep(latency / len(words))
+                chunk = {"id": "load-test", "object": "chat.completion.chunk", "created": 0, "model": body["model"],
+                         "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}]}
+                yield f"data: {json.dumps(chunk)}\n\n"
+            tail = {"id": "load-test", "object": "chat.completion.chunk", "created": 0, "model": body["model"],
+                    "choices": [], "usage": usage}
+            yield f"data: {json.dumps(tail)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(chunks(), media_type="text/event-stream", headers=headers)
+
+    uvicorn.run(mock, host="127.0.0.1", port=port, log_level="warning")
+
+
+# --- Сервер под нагрузкой (отдельный процесс) ---
+
+def install_block_monitor(app, threshold: float) -> list:
+    """Засекает каждый шаг цикла событий и запоминает шаги дольше `threshold` секунд.
+
+    Шаг задачи запроса выполняется в её контексте, поэтому метка эндпоинта из
+    заголовка видна прямо в Handle — так блокировка относится к конкретному запросу.
+    Кроме времени шага запоминаются процессорное время потока цикла (если оно много
+    меньше, шаг не работал сам, а ждал GIL, занятый другими потоками) и время
+    сборки мусора, которая пришлась на шаг (полная сборка — десятки миллисекунд).
+    """
+    import contextvars
+    import gc
+
+    label_var = contextvars.ContextVar("load_test_endpoint", default=None)
+    blocks = []
+    gc_time = {"total": 0.0, "started": 0.0}
+    original_run = asyncio.events.Handle._run
+
+    def on_gc(phase, info):
+        if phase == "start":
+            gc_time["started"] = time.perf_counter()
+        else:
+            gc_time["total"] += time.perf_counter() - gc_time["started"]
+
+    def timed_run(handle):
+        started, cpu_started, gc_started = time.perf_counter(), time.thread_time(), gc_time["total"]
+        original_run(handle)
+        elapsed = time.perf_counter() - started
+        if elapsed >= threshold:
+            context = getattr(handle, "_context", None)
+            label = context.get(label_var) if context is not None else None
+            blocks.append({"endpoint": label or "(background)", "ms": elapsed * 1000,
+                           "cpu_ms": (time.thread_time() - cpu_started) * 1000,
+                           "gc_ms": (gc_time["total"] - gc_started) * 1000,
+                           "callback": repr(handle._callback)[:160]})
+
+    gc.callbacks.append(on_gc)
+
+    asyncio.events.Handle._run = timed_run
+
+    class LabelMiddleware:
+        def __init__(self, inner):
+            self.inner = inner
+
+        async def __call__(self, scope, receive, send):
+            if scope["type"] == "http":
+                label = dict(scope["headers"]).get(LABEL_HEADER.encode())
+                label_var.set(label.decode() if label else f"{scope['method']} {scope['path']}")
+            await self.inner(scope, receive, send)
+
+    async def blocks_endpoint():
+        report = list(blocks)
+        blocks.clear()
+        return {"blocks": report}
+
+    app.add_middleware(LabelMiddleware)
+    app.add_api_route(BLOCKS_PATH, blocks_endpoint, methods=["GET"], include_in_schema=False)
+    return blocks
+
+
+def serve_app(port: int, threshold_ms: float):
+    import uvicorn
+    from app.web import app
+
+    install_block_monitor(app, threshold_ms / 1000)
+    # Чистый asyncio вместо uvloop: монитор подменяет asyncio.events.Handle._run
+    uvicorn.run(app, host="127.0.0.1", port=port, loop="asyncio", log_level="warning")
+
+
+# --- Подготовка данных и запуск процессов ---
+
+def seed_storage(sqlite_path: str, posts: int) -> tuple:
+    """Наполняет временную SQLite-базу постами; возвращает (ID постов, версию коллекции)."""
+    from app import firebase_manager
+    from app.storage import create_storage, set_storage
+
+    set_storage(create_storage("sqlite", sqlite_path))
+    base_date = datetime.now(timezone.utc)
+    post_ids = []
+    for i in range(posts):
+        post_ids.append(firebase_manager.save_post({
+            "source_channel": f"load_test_{i % 5}",
+            "original_message_id": i,
+            "original_ids": [i],
+            "original_date": base_date - timedelta(minutes=i),
+            "content": f"Load test post {i}. " + TRANSLATE_TEXT,
+            "translated_content": None,
+            "target_lang": None,
+            "has_media": False,
+            "media_count": 0,
+            "is_merged": False,
+            "is_top_post": False,
+            "original_views": i,
+        }))
+    firebase_manager.save_channel("load_test")
+    return post_ids, firebase_manager.get_posts_version()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _spawn(args: list, env: dict, log_path: str) -> subprocess.Popen:
+    log = open(log_path, "w")
+    return subprocess.Popen([sys.executable, os.path.abspath(__file__), *args], cwd=BACKEND_DIR,
+                            env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+async def _wait_ready(client, url: str, process: subprocess.Popen, log_path: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            break
+        try:
+            await client.get(url)
+            return
+        except Exception:
+            await asyncio.sleep(0.2)
+    with open(log_path) as log:
+        tail = log.read()[-2000:]
+    raise RuntimeError(f"{url} did not start:\n{tail}")
+
+
+# --- Нагрузка ---
+
+def _percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def _request(client, name: str, spec: tuple, etags: dict) -> int:
+    method, path, body = spec
+    headers = {LABEL_HEADER: name}
+    if name == "posts_etag" and etags.get("posts"):
+        headers["If-None-Match"] = etags["posts"]
+    # Время считается до конца тела: у потокового перевода — до последнего события
+    async with client.stream(method, path(), json=body, headers=headers) as response:
+        async for _ in response.aiter_raw():
+            pass
+        if name == "posts_etag" and response.headers.get("etag"):
+            etags["posts"] = response.headers["etag"]
+        return response.status_code
+
+
+async def run_load(base_url: str, endpoints: dict, clients: int, duration: float) -> tuple:
+    import httpx
+
+    samples = {name: [] for name in endpoints}
+    errors = {name: 0 for name in endpoints}
+    etags = {}
+    deadline = time.monotonic() + duration
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+        async def worker(seed: int):
+            names = list(endpoints)
+            random.Random(seed).shuffle(names)
+            i = 0
+            while time.monotonic() < deadline:
+                name = names[i % len(names)]
+                i += 1
+                started = time.perf_counter()
+                try:
+                    status = await _request(client, name, endpoints[name], etags)
+                except Exception as e:
+                    print(f"{name}: {e.__class__.__name__}: {e}")
+                    status = None
+                samples[name].append((time.perf_counter() - started) * 1000)
+                if status is None or status >= 400:
+                    errors[name] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(clients)))
+        elapsed = time.perf_counter() - started
+
+        blocks = (await client.get(BLOCKS_PATH)).json()["blocks"]
+    return samples, errors, elapsed, blocks
+
+
+def print_report(samples: dict, errors: dict, elapsed: float, blocks: list, threshold_ms: float):
+    total = sum(len(v) for v in samples.values())
+    print(f"\n{total} requests in {elapsed:.1f}s: {total / elapsed:.1f} req/s\n")
+    print(f"{'endpoint':<18}{'n':>7}{'errors':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, values in samples.items():
+        if not values:
+            continue
+        print(f"{name:<18}{len(values):>7}{errors[name]:>8}{len(values) / elapsed:>9.1f}"
+              f"{statistics.median(values):>10.1f}{_percentile(values, 95):>10.1f}"
+              f"{_percentile(values, 99):>10.1f}{max(values):>10.1f}")
+
+    if not blocks:
+        print(f"\nNo event loop blocks longer than {threshold_ms:.0f} ms")
+        return
+    print(f"\nEvent loop blocked longer than {threshold_ms:.0f} ms {len(blocks)} times:")
+    by_endpoint = {}
+    for block in blocks:
+        # Сборка мусора и ожидание GIL — не вина эндпоинта, на шаг которого они пришлись
+        if block["gc_ms"] >= block["ms"] / 2:
+            name = f"{block['endpoint']} (GC)"
+        elif block["cpu_ms"] < block["ms"] / 2:
+            name = f"{block['endpoint']} (GIL)"
+        else:
+            name = block["endpoint"]
+        by_endpoint.setdefault(name, []).append(block)
+    print(f"{'endpoint':<26}{'blocks':>8}{'max ms':>10}{'cpu ms':>10}{'gc ms':>10}{'total ms':>10}  example")
+    for name, items in sorted(by_endpoint.items(), key=lambda kv: -sum(b["ms"] for b in kv[1])):
+        worst = max(items, key=lambda b: b["ms"])
+        print(f"{name:<26}{len(items):>8}{worst['ms']:>10.1f}{worst['cpu_ms']:>10.1f}{worst['gc_ms']:>10.1f}"
+              f"{sum(b['ms'] for b in items):>10.1f}  {worst['callback']}")
+    if any(name.endswith("(GC)") for name in by_endpoint):
+        print("(GC): most of the step was a garbage collection pass")
+    if any(name.endswith("(GIL)") for name in by_endpoint):
+        print("(GIL): the step mostly waited for threads holding the GIL, e.g. CPU-bound work in asyncio.to_thread")
+
+
+async def run(args) -> int:
+    import httpx
+
+    names = [name.strip() for name in args.endpoints.split(",") if name.strip()]
+    with tempfile.TemporaryDirectory() as tmp:
+        sqlite_path = os.path.join(tmp, "load_test.db")
+        post_ids, version = seed_storage(sqlite_path, args.posts)
+        endpoints = build_endpoints(post_ids, version)
+        unknown = [name for name in names if name not in endpoints]
+        if unknown:
+            print(f"Unknown endpoints: {', '.join(unknown)}; available: {', '.join(endpoints)}")
+            return 2
+        endpoints = {name: endpoints[name] for name in names}
+
+        app_port, openai_port = _free_port(), _free_port()
+        env = {
+            **os.environ,
+            "STORAGE_BACKEND": "sqlite",
+            "STORAGE_SQLITE_PATH": sqlite_path,
+            "DEDUP_PATH": os.path.join(tmp, "dedup.db"),
+            # Маркер миграций временной базы живёт и удаляется вместе с ней
+            "MIGRATIONS_MARKER_PATH": os.path.join(tmp, "migrations.json"),
+            "OPENAI_API_KEY": "load-test",
+            "OPENAI_BASE_URL": f"http://127.0.0.1:{openai_port}/v1",
+        }
+        mock_log, app_log = os.path.join(tmp, "openai.log"), os.path.join(tmp, "app.log")
+        processes = [
+            _spawn(["--mock-openai", "--port", str(openai_port), "--openai-latency", str(args.openai_latency)], env, mock_log),
+            _spawn(["--serve", "--port", str(app_port), "--block-threshold", str(args.block_threshold)], env, app_log),
+        ]
+        try:
+            base_url = f"http://127.0.0.1:{app_port}"
+            async with httpx.AsyncClient(base_url=base_url, timeout=30) as probe:
+                await _wait_ready(probe, f"http://127.0.0.1:{openai_port}/docs", processes[0], mock_log)
+                await _wait_ready(probe, f"{base_url}/jobs", processes[1], app_log)
+                # Прогрев: ленивые импорты (OpenAI и т.п.) не должны попасть в замер
+                for name, spec in endpoints.items():
+                    await _request(probe, name, spec, {})
+                await probe.get(BLOCKS_PATH)
+
+            print(f"{args.clients} clients for {args.duration:.0f}s against {len(post_ids)} posts, "
+                  f"OpenAI latency {args.openai_latency * 1000:.0f} ms")
+            samples, errors, elapsed, blocks = await run_load(base_url, endpoints, args.clients, args.duration)
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait(timeout=10)
+
+    print_report(samples, errors, elapsed, blocks, args.block_threshold)
+    return 1 if blocks and args.fail_on_block else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=20, help="конкурентных клиентов")
+    parser.add_argument("--duration", type=float, default=10, help="секунд нагрузки")
+    parser.add_argument("--posts", type=int, default=500, help="постов во временной базе")
+    parser.add_argument("--endpoints", default=DEFAULT_ENDPOINTS, help="через запятую")
+    parser.add_argument("--openai-latency", type=float, default=0.2, help="задержка ответа заглушки OpenAI, сек")
+    parser.add_argument("--block-threshold", type=float, default=50, help="порог блокировки цикла событий, мс")
+    parser.add_argument("--fail-on-block", action="store_true", help="код 1, если цикл событий блокировался")
+    # Внутренние режимы: процессы, которые скрипт запускает сам
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--mock-openai", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mock_openai:
+        serve_mock_openai(args.port, args.openai_latency)
+        return 0
+    if args.serve:
+        serve_app(args.port, args.block_threshold)
+        return 0
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
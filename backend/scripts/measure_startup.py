@@ -0,0 +1,74 @@
+"""Замер холодного старта backend: время `import app.web` в чистом интерпретаторе.
+
+Запуск из каталога backend/:
+
+    python scripts/measure_startup.py --runs 5 --target 1.0
+
+Каждый прогон — отдельный процесс, поэтому кэш модулей не влияет на результат.
+Скрипт также проверяет, что тяжёлые зависимости (Telethon, Pillow, OpenAI,
+firebase_admin) не импортируются при старте, и завершается с кодом 1, если
+медианное время превышает цель или тяжёлый модуль загрузился заранее.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ["telethon", "PIL", "openai", "firebase_admin", "google.cloud.firestore"]
+
+PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import app.web
+elapsed = time.perf_counter() - t0
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(json.dumps({{"elapsed": elapsed, "heavy": heavy}}))
+"""
+
+
+def measure_once() -> dict:
+    code = PROBE.format(heavy=HEAVY_MODULES)
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=BACKEND_DIR,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="количество прогонов")
+    parser.add_argument("--target", type=float, default=1.0, help="цель по медиане, секунды")
+    args = parser.parse_args()
+
+    timings = []
+    heavy_loaded = set()
+    for _ in range(max(1, args.runs)):
+        result = measure_once()
+        timings.append(result["elapsed"])
+        heavy_loaded.update(result["heavy"])
+
+    median = statistics.median(timings)
+    print(f"import app.web: min={min(timings):.3f}s median={median:.3f}s max={max(timings):.3f}s (runs={len(timings)})")
+
+    ok = True
+    if heavy_loaded:
+        print(f"FAIL: heavy modules imported at startup: {', '.join(sorted(heavy_loaded))}")
+        ok = False
+    if median > args.target:
+        print(f"FAIL: median {median:.3f}s exceeds target {args.target:.3f}s")
+        ok = False
+    if ok:
+        print(f"OK: cold start within target {args.target:.3f}s")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,48 +1,88 @@
-import { useState, useCallback } from 'react';
-import { getPosts, translatePost, deletePost, deleteAllPosts } from '../services/api';
+import { useState, useCallback, useRef } from 'react';
+import { getPosts, getPostChanges, streamTranslatePost, deletePost, deleteAllPosts } from '../services/api';
+
+const byDateDesc = (a, b) => new Date(b.original_date) - new Date(a.original_date);
+
+// Применяет дельту /posts/changes к текущему списку
+const applyChanges = (posts, changes) => {
+  const removed = new Set([...changes.deleted, ...changes.posts.map((p) => p.id)]);
+  const kept = posts.filter((p) => !removed.has(p.id));
+  return [...kept, ...changes.posts].sort(byDateDesc);
+};
 
 export const usePosts = () => {
   const [posts, setPosts] = useState([]);
   const [isLoading, setIsLoading] = useState(false);
   const [error, setError] = useState(null);
+  // Версия коллекции последнего полного списка: после него догружаем только изменения
+  const versionRef = useRef(null);
+
+  const fetchAllPosts = useCallback(async () => {
+    const response = await getPosts();
+    if (!response.data.ok) {
+      throw new Error('Failed to fetch posts');
+    }
+    setPosts(response.data.posts);
+    versionRef.current = response.data.version ?? null;
+  }, []);
 
   const fetchPosts = useCallback(async () => {
     setIsLoading(true);
     setError(null);
     try {
-      const response = await getPosts();
-      if (response.data.ok) {
-        setPosts(response.data.posts);
-      } else {
-        throw new Error('Failed to fetch posts');
+      if (versionRef.current === null) {
+        await fetchAllPosts();
+        return;
+      }
+      const response = await getPostChanges(versionRef.current);
+      if (!response.data.ok) {
+        throw new Error('Failed to fetch post changes');
+      }
+      if (response.data.reset) {
+        await fetchAllPosts();
+        return;
       }
+      if (response.data.posts.length || response.data.deleted.length) {
+        setPosts((prev) => applyChanges(prev, response.data));
+      }
+      versionRef.current = response.data.version;
     } catch (err) {
       setError(err.message || 'An unknown error occurred');
     } finally {
       setIsLoading(false);
     }
-  }, []);
+  }, [fetchAllPosts]);
 
   const handleTranslatePost = useCallback(
     async (postId, targetLang) => {
+      // Показываем перевод по мере генерации, не дожидаясь ответа целиком
+      const setPartial = (text) =>
+        setPosts((prev) => prev.map((p) => (p.id === postId ? { ...p, translated_content: text } : p)));
+      // При ошибке возвращаем перевод, который был до запроса: на сервере пост не изменился
+      const previous = posts.find((p) => p.id === postId)?.translated_content ?? null;
+      let partial = '';
       try {
-        await translatePost(postId, targetLang);
-        // После успешного перевода обновляем список, чтобы показать результат
+        await streamTranslatePost(postId, targetLang, (token) => {
+          partial += token;
+          setPartial(partial);
+        });
+        // После успешного перевода догружаем изменения, чтобы показать сохранённый результат
         fetchPosts();
       } catch (err) {
         // Можно добавить более гранулярную обработку ошибок для конкретного поста
+        setPartial(previous);
         console.error(`Failed to translate post ${postId}:`, err);
         alert(`Error translating post: ${err.message}`);
       }
     },
-    [fetchPosts]
+    [posts, fetchPosts]
   );
 
   const handleDeletePost = useCallback(
     async (postId) => {
       try {
         await deletePost(postId);
-        // После успешного удаления обновляем список
+        // После успешного удаления догружаем изменения
         fetchPosts();
       } catch (err) {
         console.error(`Failed to delete post ${postId}:`, err);
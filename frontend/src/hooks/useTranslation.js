@@ -1,5 +1,5 @@
 import { useState } from 'react';
-import { translateText } from '../services/api';
+import { streamTranslateText } from '../services/api';
 
 export const useTranslation = () => {
   const [translatedText, setTranslatedText] = useState('');
@@ -14,12 +14,14 @@ export const useTranslation = () => {
     setIsTranslating(true);
     setTranslationError(null);
     try {
-      const response = await translateText(text, lang, prompt);
-      if (response.data.ok) {
-        setTranslatedText(response.data.translated_text);
-      } else {
-        throw new Error(response.data.error || 'Failed to translate');
-      }
+      // Текст появляется по мере генерации; в конце заменяем его готовым переводом
+      let partial = '';
+      setTranslatedText('');
+      const translated = await streamTranslateText(text, lang, prompt, (token) => {
+        partial += token;
+        setTranslatedText(partial);
+      });
+      setTranslatedText(translated);
     } catch (err) {
       const errorMsg = err.response?.data?.error || err.message || 'An unknown error occurred';
       setTranslationError(errorMsg);
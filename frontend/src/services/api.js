@@ -25,12 +25,61 @@ export const translateText = (text, target_lang = 'EN', prompt = null) => {
   return api.post('/translate', { text, target_lang, prompt });
 };
 
+// --- Потоковый перевод (Server-Sent Events) ---
+// EventSource умеет только GET, поэтому читаем поток через fetch и разбираем события сами.
+const streamEvents = async (path, body, onToken) => {
+  const response = await fetch(`${api.defaults.baseURL}${path}`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify(body),
+  });
+  if (!response.ok) {
+    const data = await response.json().catch(() => ({}));
+    throw new Error(data.error || `Request failed with status ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const raw = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      const event = raw.match(/^event: (.*)$/m)?.[1];
+      const data = JSON.parse(raw.match(/^data: (.*)$/m)?.[1] || '{}');
+      if (event === 'token') onToken(data.text);
+      if (event === 'error') throw new Error(data.error);
+      if (event === 'done') return data.translated_text;
+    }
+  }
+  throw new Error('Translation stream ended unexpectedly');
+};
+
+// onToken вызывается с каждым новым куском перевода; промис вернёт готовый текст
+export const streamTranslateText = (text, target_lang = 'EN', prompt = null, onToken = () => {}) => {
+  return streamEvents('/translate/stream', { text, target_lang, prompt }, onToken);
+};
+
+// Перевод сохраняется в пост на сервере, когда модель закончит ответ
+export const streamTranslatePost = (postId, target_lang = 'EN', onToken = () => {}) => {
+  return streamEvents(`/posts/${postId}/translate/stream`, { target_lang }, onToken);
+};
+
 // --- API для работы с постами ---
 
 export const getPosts = () => {
   return api.get('/posts');
 };
 
+// Только изменения после версии since: новые/изменённые посты и ID удалённых
+export const getPostChanges = (since) => {
+  return api.get('/posts/changes', { params: { since } });
+};
+
 export const translatePost = (postId, target_lang = 'EN') => {
   return api.post(`/posts/${postId}/translate`, { target_lang });
 };